@@ -0,0 +1,115 @@
+"""In-process caches.
+
+They live in the API process, which is correct for the single uvicorn process the backend
+runs as; writes made through the services invalidate them after committing.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+from pydantic_core import to_json
+
+class LRUCache:
+    """Thread-safe mapping bounded to maxsize entries, evicting the least recently used one."""
+
+    def __init__(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[object], bool]) -> int:
+        """Drop every entry whose value matches predicate; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key, value in self._entries.items() if predicate(value)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "maxsize": self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+class StatsCache:
+    """Computed stats per notebook (None for the global stats) together with their ETag.
+
+    Entries are keyed by the notebook's invalidation generation and the current UTC day, so a
+    write that bumps the generation, or midnight rolling the today/week/month windows, makes
+    older entries unreachable; the LRU bound then evicts them. Take the key *before* reading
+    the database and store under that key, so stats computed concurrently with a write are
+    never filed under the generation that follows it.
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = LRUCache(maxsize)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def key(self, notebook_id: Optional[int], view: str = "stats") -> Tuple[str, Optional[int], int, str]:
+        """Cache key for a notebook's stats; view tells apart responses built from the same data,
+        e.g. the whole-tree stats, which use the global generation (notebook_id None)."""
+        today = datetime.now(timezone.utc).date().isoformat()
+        return view, notebook_id, self._generations.get(notebook_id, 0), today
+
+    def get(self, key: Tuple) -> Optional[Tuple[object, str]]:
+        return self._entries.get(key)
+
+    def put(self, key: Tuple, stats) -> str:
+        """Store stats and return their ETag, a hash of the serialized response."""
+        etag = '"' + hashlib.sha256(to_json(stats)).hexdigest()[:32] + '"'
+        self._entries.put(key, (stats, etag))
+        return etag
+
+    def invalidate(self, notebook_ids: Iterable[int]):
+        """Bump the generation of each notebook and of the global stats."""
+        with self._lock:
+            for notebook_id in [*notebook_ids, None]:
+                self._generations[notebook_id] = self._generations.get(notebook_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def info(self) -> Dict[str, int]:
+        return self._entries.info()
+
+stats_cache = StatsCache(int(os.getenv("STATS_CACHE_SIZE", "1024")))
+
+# Question id -> AnswerKey (correct answer, explanation, notebook), so grading an answer needs no database read
+answer_key_cache = LRUCache(int(os.getenv("ANSWER_KEY_CACHE_SIZE", "10000")))
@@ -1,21 +1,52 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
 import os
 import time
 from sqlalchemy.exc import OperationalError
+from app.core.migrations import apply_migrations, applied_versions
+from app import models  # noqa: F401 - registers the tables on SQLModel.metadata
 
 # Database Connection
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
+
+def async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (asyncpg for Postgres, aiosqlite for SQLite)."""
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    driver = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    return f"{driver.get(backend, scheme)}://{rest}"
+
+def pool_options(url: str) -> dict:
+    """Connection pool settings from DB_POOL_SIZE, DB_MAX_OVERFLOW and DB_POOL_RECYCLE (seconds)."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL))
 
 def get_session():
     with Session(engine) as session:
         yield session
 
+async def get_async_session():
+    # Objects are returned to FastAPI after commit, so keep them loaded rather than expired
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
 def init_db():
     retries = 5
     for i in range(retries):
         try:
             SQLModel.metadata.create_all(engine)
+            apply_migrations(engine)
             print("Database initialized successfully.")
             return
         except OperationalError as e:
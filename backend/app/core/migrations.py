@@ -0,0 +1,170 @@
+"""Versioned schema migrations.
+
+``SQLModel.metadata.create_all`` creates missing tables (with the indexes declared on the
+models) but never alters tables that already exist. Each migration below brings an existing
+database up to date and is written to be idempotent, because a fresh database already got
+the current columns and indexes from ``create_all``. Applied versions are recorded in the
+``schema_migration`` table.
+
+To add a migration, append a ``(version, description, function)`` entry to ``MIGRATIONS``;
+the function receives a SQLAlchemy ``Connection`` inside a transaction.
+"""
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+from app.services.question_service import QuestionService
+
+migration_metadata = MetaData()
+schema_migration = Table(
+    "schema_migration",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def add_column(conn: Connection, table_name: str, column_name: str):
+    """Add a model column to an existing table unless it is already there."""
+    if column_name in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+        return
+    column = SQLModel.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+
+def create_indexes(conn: Connection, *index_names: str):
+    """Create the named indexes, as declared on the models, unless they exist."""
+    pending = set(index_names)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in pending:
+                index.create(conn, checkfirst=True)
+                pending.discard(index.name)
+    if pending:
+        raise ValueError(f"Unknown indexes: {', '.join(sorted(pending))}")
+
+def _question_content_hash(conn: Connection):
+    add_column(conn, "question", "content_hash")
+    create_indexes(conn, "ix_question_notebook_content_hash")
+
+def _hot_query_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "ix_attempt_question_id_timestamp",
+        "ix_question_notebook_id",
+        "ix_notebook_parent_id",
+    )
+
+# The backfills below spell out their SQL rather than calling the services' rebuild methods, so
+# a migration keeps doing what it did when it was written whatever the services do later.
+
+def _closure_backfill(conn: Connection):
+    SQLModel.metadata.tables["notebookclosure"].create(conn, checkfirst=True)
+    conn.execute(text("DELETE FROM notebookclosure"))
+    conn.execute(text(
+        "WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS ("
+        " SELECT id, id, 0 FROM notebook"
+        " UNION ALL"
+        " SELECT tree.ancestor_id, notebook.id, tree.depth + 1"
+        " FROM tree JOIN notebook ON notebook.parent_id = tree.descendant_id"
+        ") "
+        "INSERT INTO notebookclosure (ancestor_id, descendant_id, depth) "
+        "SELECT ancestor_id, descendant_id, depth FROM tree"
+    ))
+
+def _question_status_backfill(conn: Connection):
+    SQLModel.metadata.tables["questionstatus"].create(conn, checkfirst=True)
+    conn.execute(text("DELETE FROM questionstatus"))
+    conn.execute(text(
+        "INSERT INTO questionstatus (question_id, last_is_correct, last_attempt_at, attempt_count, correct_count) "
+        "SELECT question_id, is_correct, timestamp, attempt_count, correct_count FROM ("
+        " SELECT question_id, is_correct, timestamp,"
+        " ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY timestamp DESC, id DESC) AS rn,"
+        " COUNT(*) OVER (PARTITION BY question_id) AS attempt_count,"
+        " SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) OVER (PARTITION BY question_id) AS correct_count"
+        " FROM attempt WHERE question_id IN (SELECT id FROM question)"
+        ") ranked WHERE rn = 1"
+    ))
+
+def _daily_activity_backfill(conn: Connection):
+    SQLModel.metadata.tables["dailyactivity"].create(conn, checkfirst=True)
+    day = "CAST(attempt.timestamp AS DATE)" if conn.dialect.name == "postgresql" else "date(attempt.timestamp)"
+    conn.execute(text("DELETE FROM dailyactivity"))
+    conn.execute(text(
+        "INSERT INTO dailyactivity (notebook_id, day, attempts, correct) "
+        f"SELECT question.notebook_id, {day}, COUNT(attempt.id), SUM(CASE WHEN attempt.is_correct THEN 1 ELSE 0 END) "
+        "FROM attempt JOIN question ON question.id = attempt.question_id "
+        f"GROUP BY question.notebook_id, {day}"
+    ))
+
+def _notebook_counters(conn: Connection):
+    # Needs the closure and status tables filled in by migrations 3 and 4
+    SQLModel.metadata.tables["notebookcounter"].create(conn, checkfirst=True)
+    conn.execute(text("DELETE FROM notebookcounter"))
+    conn.execute(text(
+        "INSERT INTO notebookcounter (notebook_id, total, attempted, correct) "
+        "SELECT notebookclosure.ancestor_id, COUNT(question.id), COUNT(questionstatus.question_id),"
+        " COALESCE(SUM(CASE WHEN questionstatus.last_is_correct THEN 1 ELSE 0 END), 0) "
+        "FROM notebookclosure "
+        "LEFT JOIN question ON question.notebook_id = notebookclosure.descendant_id "
+        "LEFT JOIN questionstatus ON questionstatus.question_id = question.id "
+        "GROUP BY notebookclosure.ancestor_id"
+    ))
+
+def _question_hash_backfill(conn: Connection):
+    # The hash is defined in Python, so rows are read and hashed in id-ordered batches. It must
+    # match what uploads compute, which is why this one calls QuestionService.content_hash. The
+    # oldest copy of each duplicate keeps the hash; later copies stay NULL, outside the unique index.
+    question = SQLModel.metadata.tables["question"]
+    seen = set(conn.execute(
+        select(question.c.notebook_id, question.c.content_hash).where(question.c.content_hash.is_not(None))
+    ).all())
+    set_hash = question.update().where(question.c.id == bindparam("row_id")).values(content_hash=bindparam("hash"))
+    last_id = 0
+    while True:
+        batch = conn.execute(
+            select(question).where(question.c.content_hash.is_(None), question.c.id > last_id).order_by(question.c.id).limit(1000)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        updates = []
+        for row in batch:
+            key = (row.notebook_id, QuestionService.content_hash(row))
+            if key not in seen:
+                seen.add(key)
+                updates.append({"row_id": row.id, "hash": key[1]})
+        if updates:
+            conn.execute(set_hash, updates)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "question.content_hash and its per-notebook unique index", _question_content_hash),
+    (2, "indexes for latest-attempt, notebook question and child notebook lookups", _hot_query_indexes),
+    (3, "backfill the notebook closure table from parent links", _closure_backfill),
+    (4, "backfill question statuses from attempt history", _question_status_backfill),
+    (5, "backfill the daily_activity rollup from attempt history", _daily_activity_backfill),
+    (6, "backfill per-notebook question counters", _notebook_counters),
+    (7, "backfill question.content_hash for questions created before it existed", _question_hash_backfill),
+]
+
+def applied_versions(engine: Engine) -> List[int]:
+    migration_metadata.create_all(engine)
+    with engine.connect() as conn:
+        return list(conn.execute(select(schema_migration.c.version).order_by(schema_migration.c.version)).scalars())
+
+def apply_migrations(engine: Engine) -> List[int]:
+    """Apply pending migrations in version order, one transaction each. Returns the versions applied."""
+    done = set(applied_versions(engine))
+    applied = []
+    for version, description, migrate in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migration.insert().values(
+                version=version, description=description, applied_at=datetime.now(timezone.utc)
+            ))
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
@@ -1,33 +1,92 @@
 from typing import List, Optional
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Column, JSON
-from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Index, JSON
+from datetime import date, datetime, timezone
+from uuid import uuid4
+
+def utc_now() -> datetime:
+    """The current UTC time as a naive datetime.
+
+    Timestamps are stored as naive UTC in TIMESTAMP WITHOUT TIME ZONE columns (declared with
+    sa_type=DateTime, since newer SQLModel releases default to aware-only columns); asyncpg
+    refuses to bind an aware datetime to them.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class Notebook(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
-    parent_id: Optional[int] = Field(default=None, foreign_key="notebook.id")
+    parent_id: Optional[int] = Field(default=None, foreign_key="notebook.id", index=True)
     
     # Relationships
     questions: List["Question"] = Relationship(back_populates="notebook")
 
 class Question(SQLModel, table=True):
+    __table_args__ = (
+        # Re-uploading the same question into a notebook is detected through this index
+        Index("ix_question_notebook_content_hash", "notebook_id", "content_hash", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    notebook_id: int = Field(foreign_key="notebook.id")
+    notebook_id: int = Field(foreign_key="notebook.id", index=True)
     content: str
     type: str # "multiple_choice", "true_false"
     language: str
     options: List[str] = Field(default=[], sa_column=Column(JSON))
     correct_answer: str
     explanation: str
+    content_hash: Optional[str] = Field(default=None, max_length=64)
 
     notebook: Optional[Notebook] = Relationship(back_populates="questions")
     attempts: List["Attempt"] = Relationship(back_populates="question")
 
 class Attempt(SQLModel, table=True):
+    __table_args__ = (
+        # Latest-attempt lookups and per-question history
+        Index("ix_attempt_question_id_timestamp", "question_id", "timestamp"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     question_id: int = Field(foreign_key="question.id")
     is_correct: bool
-    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    timestamp: datetime = Field(default_factory=utc_now, sa_type=DateTime)
     
     question: Optional[Question] = Relationship(back_populates="attempts")
+
+class QuestionStatus(SQLModel, table=True):
+    """Latest result per question, maintained by every submitted attempt."""
+    question_id: int = Field(foreign_key="question.id", primary_key=True)
+    last_is_correct: bool = Field(index=True)
+    last_attempt_at: datetime = Field(sa_type=DateTime)
+    attempt_count: int = 0
+    correct_count: int = 0
+
+class NotebookCounter(SQLModel, table=True):
+    """Question totals for a notebook including all of its descendants, kept in step with every write."""
+    notebook_id: int = Field(foreign_key="notebook.id", primary_key=True)
+    total: int = 0
+    attempted: int = 0
+    correct: int = 0
+
+class NotebookClosure(SQLModel, table=True):
+    """Every (ancestor, descendant) pair of the notebook tree, including each notebook with itself at depth 0."""
+    ancestor_id: int = Field(foreign_key="notebook.id", primary_key=True)
+    descendant_id: int = Field(foreign_key="notebook.id", primary_key=True, index=True)
+    depth: int
+
+class StudySession(SQLModel, table=True):
+    """A study run: the filtered question ids in presentation order and how far the student got."""
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    notebook_id: int = Field(foreign_key="notebook.id")
+    mode: str
+    seed: Optional[int] = None # Set when the order was shuffled; reproduces the permutation
+    question_ids: List[int] = Field(default=[], sa_column=Column(JSON))
+    position: int = 0
+    created_at: datetime = Field(default_factory=utc_now, sa_type=DateTime)
+
+class DailyActivity(SQLModel, table=True):
+    """Attempts and correct answers per notebook per UTC day, maintained by submit_attempt."""
+    notebook_id: int = Field(foreign_key="notebook.id", primary_key=True)
+    day: date = Field(primary_key=True, index=True)
+    attempts: int = 0
+    correct: int = 0
@@ -1,24 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
-from app.core.database import get_session
-from app.schemas import NotebookCreate, NotebookRead
+from app.core.database import get_async_session
+from app.schemas import NotebookCreate, NotebookRead, NotebookUpdate
 from app.models import Notebook
-from app.services.notebook_service import NotebookService
+from app.services.notebook_service import AsyncNotebookService
 
 router = APIRouter(prefix="/notebooks", tags=["Notebooks"])
 
 @router.post("/", response_model=Notebook)
-def create_notebook(notebook: NotebookCreate, session: Session = Depends(get_session)):
-    return NotebookService.create(session, notebook)
+async def create_notebook(notebook: NotebookCreate, session: AsyncSession = Depends(get_async_session)):
+    db_notebook = await AsyncNotebookService.create(session, notebook)
+    if not db_notebook:
+        raise HTTPException(status_code=404, detail="Parent notebook not found")
+    return db_notebook
 
 @router.get("/", response_model=List[NotebookRead])
-def get_notebooks(session: Session = Depends(get_session)):
-    return NotebookService.get_all(session)
+async def get_notebooks(session: AsyncSession = Depends(get_async_session)):
+    return await AsyncNotebookService.get_all(session)
+
+@router.get("/{notebook_id}/breadcrumbs", response_model=List[Notebook])
+async def get_breadcrumbs(notebook_id: int, session: AsyncSession = Depends(get_async_session)):
+    breadcrumbs = await AsyncNotebookService.get_ancestors(session, notebook_id)
+    if not breadcrumbs:
+        raise HTTPException(status_code=404, detail="Notebook not found")
+    return breadcrumbs
+
+@router.patch("/{notebook_id}", response_model=Notebook)
+async def update_notebook(notebook_id: int, data: NotebookUpdate, session: AsyncSession = Depends(get_async_session)):
+    try:
+        notebook = await AsyncNotebookService.update(session, notebook_id, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not notebook:
+        raise HTTPException(status_code=404, detail="Notebook not found")
+    return notebook
 
 @router.delete("/{notebook_id}")
-def delete_notebook(notebook_id: int, session: Session = Depends(get_session)):
-    success = NotebookService.delete(session, notebook_id)
+async def delete_notebook(notebook_id: int, session: AsyncSession = Depends(get_async_session)):
+    success = await AsyncNotebookService.delete(session, notebook_id)
     if not success:
         raise HTTPException(status_code=404, detail="Notebook not found")
     return {"ok": True}
@@ -1,46 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session
-from typing import List
-from app.core.database import get_session
-from app.schemas import QuestionImport, AttemptCreate, AttemptResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from app.core.database import get_async_session
+from app.schemas import (
+    AttemptBatch, AttemptBatchResponse, AttemptBatchResult, AttemptCreate, AttemptResponse, QuestionImport,
+    StreamImportResult,
+)
 from app.models import Question
-from app.services.question_service import QuestionService
-from app.services.notebook_service import NotebookService
+from app.services.attempt_writer import attempt_writer
+from app.services.question_service import AsyncQuestionService, QuestionService
+from app.services.notebook_service import AsyncNotebookService
+from app.services.ingest_service import IngestService
 
 router = APIRouter(tags=["Questions"])
 
 @router.post("/questions/upload/{notebook_id}")
-def upload_questions(notebook_id: int, data: QuestionImport, session: Session = Depends(get_session)):
-    notebook = NotebookService.get_by_id(session, notebook_id)
+async def upload_questions(
+    notebook_id: int,
+    data: QuestionImport,
+    on_duplicate: str = Query("skip", enum=QuestionService.DUPLICATE_MODES),
+    session: AsyncSession = Depends(get_async_session)
+):
+    notebook = await AsyncNotebookService.get_by_id(session, notebook_id)
     if not notebook:
         raise HTTPException(status_code=404, detail="Notebook not found")
     
-    count = QuestionService.upload_questions(session, notebook_id, data)
-    return {"message": f"Imported {count} questions"}
+    ids = await AsyncQuestionService.bulk_insert_questions(session, notebook_id, data.questions, on_duplicate)
+    return {"message": f"Imported {len(ids)} questions", "ids": ids, "skipped": len(data.questions) - len(ids)}
+
+@router.post("/questions/upload/{notebook_id}/stream", response_model=StreamImportResult)
+async def stream_upload_questions(
+    notebook_id: int,
+    request: Request,
+    batch_size: int = Query(500, ge=1, le=10000),
+    on_duplicate: str = Query("skip", enum=QuestionService.DUPLICATE_MODES),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Import an NDJSON stream or a JSON array of questions without buffering the whole body."""
+    notebook = await AsyncNotebookService.get_by_id(session, notebook_id)
+    if not notebook:
+        raise HTTPException(status_code=404, detail="Notebook not found")
+
+    return await IngestService.ingest(session, notebook_id, request.stream(), batch_size, on_duplicate)
+
+def _set_page_headers(response: Response, total: int, next_cursor: Optional[int]):
+    response.headers["X-Total-Count"] = str(total)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
 
 @router.get("/study/{notebook_id}", response_model=List[Question])
-def get_study_questions(
+async def get_study_questions(
     notebook_id: int, 
+    response: Response,
     mode: str = Query("all", enum=["all", "incorrect", "unresolved"]),
     randomize: bool = False,
-    session: Session = Depends(get_session)
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    count: Optional[int] = Query(None, ge=1, le=1000, description="Return this many randomly sampled questions"),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    return QuestionService.get_study_questions(session, notebook_id, mode, randomize)
+    if count is not None:
+        questions, next_cursor = await AsyncQuestionService.get_sampled_questions(session, notebook_id, mode, count), None
+    else:
+        questions, next_cursor = await AsyncQuestionService.get_study_questions(
+            session, notebook_id, mode, randomize, limit, after
+        )
+    total = await AsyncQuestionService.count_study_questions(session, notebook_id, mode)
+    _set_page_headers(response, total, next_cursor)
+    return questions
 
 @router.get("/questions/notebook/{notebook_id}", response_model=List[Question])
-def get_questions_by_notebook(notebook_id: int, session: Session = Depends(get_session)):
-    return QuestionService.get_by_notebook(session, notebook_id)
+async def get_questions_by_notebook(
+    notebook_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[int] = None,
+    session: AsyncSession = Depends(get_async_session)
+):
+    questions, next_cursor = await AsyncQuestionService.get_by_notebook(session, notebook_id, limit, after)
+    _set_page_headers(response, await AsyncQuestionService.count_by_notebook(session, notebook_id), next_cursor)
+    return questions
 
 @router.delete("/questions/{question_id}")
-def delete_question(question_id: int, session: Session = Depends(get_session)):
-    success = QuestionService.delete_question(session, question_id)
+async def delete_question(question_id: int, session: AsyncSession = Depends(get_async_session)):
+    success = await AsyncQuestionService.delete_question(session, question_id)
     if not success:
         raise HTTPException(status_code=404, detail="Question not found")
     return {"ok": True}
 
 @router.post("/attempt/", response_model=AttemptResponse)
-def submit_attempt(attempt: AttemptCreate, session: Session = Depends(get_session)):
-    result = QuestionService.submit_attempt(session, attempt.question_id, attempt.selected_option)
+async def submit_attempt(attempt: AttemptCreate, session: AsyncSession = Depends(get_async_session)):
+    if attempt_writer.running:
+        result = await attempt_writer.submit_attempt(session, attempt.question_id, attempt.selected_option)
+    else:
+        result = await AsyncQuestionService.submit_attempt(session, attempt.question_id, attempt.selected_option)
     if not result:
         raise HTTPException(status_code=404, detail="Question not found")
     return result
+
+@router.post("/attempts/batch", response_model=AttemptBatchResponse)
+async def submit_attempts(batch: AttemptBatch, session: AsyncSession = Depends(get_async_session)):
+    """Record buffered answers in one transaction. Unknown questions are reported, not recorded."""
+    results = await AsyncQuestionService.submit_attempts(session, batch.attempts)
+    return AttemptBatchResponse(
+        recorded=sum(result is not None for result in results),
+        results=[
+            AttemptBatchResult(question_id=item.question_id, result=result)
+            for item, result in zip(batch.attempts, results)
+        ],
+    )
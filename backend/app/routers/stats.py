@@ -1,15 +1,63 @@
-from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from app.core.database import get_session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, Optional
+from app.core.database import get_async_session
 from app.schemas import Stats
-from app.services.stats_service import StatsService
+from app.services.stats_service import AsyncStatsService
 
 router = APIRouter(prefix="/stats", tags=["Stats"])
 
-@router.get("/global", response_model=Stats)
-def get_global_stats(session: Session = Depends(get_session)):
-    return StatsService.get_global_stats(session)
+MAX_BATCH_IDS = 1000
 
-@router.get("/{notebook_id}", response_model=Stats)
-def get_stats(notebook_id: int, session: Session = Depends(get_session)):
-    return StatsService.get_stats(session, notebook_id)
+def _conditional(response: Response, stats, etag: str, if_none_match: Optional[str]):
+    """Return 304 without a body when the client already holds this ETag, else the stats."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return stats
+
+@router.get("/global", response_model=Stats, responses={304: {"description": "Stats unchanged"}})
+async def get_global_stats(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    stats, etag = await AsyncStatsService.get_global_stats(session)
+    return _conditional(response, stats, etag, if_none_match)
+
+@router.get("/tree", response_model=Dict[int, Stats], responses={304: {"description": "Stats unchanged"}})
+async def get_tree_stats(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Stats of every notebook (each including its descendants), keyed by notebook id."""
+    tree_stats, etag = await AsyncStatsService.get_tree_stats(session)
+    return _conditional(response, tree_stats, etag, if_none_match)
+
+@router.get("/batch", response_model=Dict[int, Stats])
+async def get_batch_stats(
+    ids: str = Query(..., description="Comma-separated notebook ids"),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Stats of the requested notebooks, keyed by id; unknown ids are left out."""
+    try:
+        notebook_ids = sorted({int(part) for part in ids.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma-separated list of integers")
+    if len(notebook_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    return await AsyncStatsService.get_batch_stats(session, notebook_ids)
+
+@router.get("/{notebook_id}", response_model=Stats, responses={304: {"description": "Stats unchanged"}})
+async def get_stats(
+    notebook_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session)
+):
+    stats, etag = await AsyncStatsService.get_stats(session, notebook_id)
+    return _conditional(response, stats, etag, if_none_match)
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+from app.core.database import get_async_session
+from app.schemas import StudySessionCreate, StudySessionItem, StudySessionRead, StudySessionUpdate
+from app.services.notebook_service import AsyncNotebookService
+from app.services.study_service import AsyncStudyService, StudyService
+
+router = APIRouter(prefix="/study/sessions", tags=["Study"])
+
+async def _get_study(session: AsyncSession, study_id: str):
+    study = await AsyncStudyService.get_by_id(session, study_id)
+    if not study:
+        raise HTTPException(status_code=404, detail="Study session not found")
+    return study
+
+@router.post("/", response_model=StudySessionRead)
+async def create_study_session(data: StudySessionCreate, session: AsyncSession = Depends(get_async_session)):
+    if not await AsyncNotebookService.get_by_id(session, data.notebook_id):
+        raise HTTPException(status_code=404, detail="Notebook not found")
+    return StudyService.to_read(await AsyncStudyService.create(session, data))
+
+@router.get("/{study_id}", response_model=StudySessionRead)
+async def get_study_session(study_id: str, session: AsyncSession = Depends(get_async_session)):
+    return StudyService.to_read(await _get_study(session, study_id))
+
+@router.get("/{study_id}/questions", response_model=List[StudySessionItem])
+async def get_study_session_questions(
+    study_id: str,
+    offset: Optional[int] = Query(None, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Serve the next questions of the session, starting at its saved position unless offset is given."""
+    study = await _get_study(session, study_id)
+    start = study.position if offset is None else offset
+    return await AsyncStudyService.get_questions(session, study, start, limit)
+
+@router.patch("/{study_id}", response_model=StudySessionRead)
+async def update_study_session(study_id: str, data: StudySessionUpdate, session: AsyncSession = Depends(get_async_session)):
+    study = await _get_study(session, study_id)
+    return StudyService.to_read(await AsyncStudyService.set_position(session, study, data.position))
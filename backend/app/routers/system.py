@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from app.core.cache import answer_key_cache, stats_cache
+from app.services.attempt_writer import attempt_writer
+from app.services.pdf_service import split_queue
+
+router = APIRouter(prefix="/system", tags=["System"])
+
+@router.get("/metrics")
+def get_metrics():
+    """In-process counters for monitoring."""
+    return {
+        "attempt_writer": {
+            "running": attempt_writer.running,
+            "queue_depth": attempt_writer.depth,
+            "written": attempt_writer.written,
+            "failed": attempt_writer.failed,
+        },
+        "answer_key_cache": answer_key_cache.info(),
+        "stats_cache": stats_cache.info(),
+        "pdf_split": split_queue.info(),
+    }
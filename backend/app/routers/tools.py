@@ -1,27 +1,50 @@
+import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import Response
-from app.services.pdf_service import PdfService
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from app.services.pdf_service import PdfService, SplitQueueFull, split_queue
 
 router = APIRouter(prefix="/tools", tags=["Tools"])
 
+# Upload bytes copied to disk per read
+SPOOL_BLOCK_SIZE = 1024 * 1024
+# Seconds a client turned away with 429 is asked to wait
+SPLIT_RETRY_AFTER = 10
+
 @router.post("/split-pdf")
 async def split_pdf(
-    file: UploadFile = File(...), 
-    chunk_size: int = Form(...)
+    file: UploadFile = File(...),
+    chunk_size: int = Form(..., ge=1)
 ):
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
-        
+
     try:
-        content = await file.read()
-        zip_bytes = PdfService.split_pdf(content, chunk_size)
-        
-        return Response(
-            content=zip_bytes,
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename=split_files.zip"
-            }
+        with split_queue.slot():
+            # The upload, every chunk and the ZIP live in one temp directory, removed once the ZIP is sent
+            workdir = PdfService.make_workdir()
+            try:
+                source_path = os.path.join(workdir, "source.pdf")
+                with open(source_path, "wb") as source:
+                    while block := await file.read(SPOOL_BLOCK_SIZE):
+                        source.write(block)
+
+                zip_path = os.path.join(workdir, "split_files.zip")
+                # Splitting is CPU-bound: keep it off the event loop so other requests are still served
+                await split_queue.split_pdf(source_path, chunk_size, zip_path)
+            except Exception as e:
+                PdfService.cleanup(workdir)
+                raise HTTPException(status_code=500, detail=str(e))
+    except SplitQueueFull:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many PDFs are being split; try again shortly",
+            headers={"Retry-After": str(SPLIT_RETRY_AFTER)}
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+
+    return FileResponse(
+        zip_path,
+        media_type="application/zip",
+        filename="split_files.zip",
+        background=BackgroundTask(PdfService.cleanup, workdir)
+    )
@@ -1,11 +1,17 @@
+from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from app.models import Question
 
 # Notebook Schemas
 class NotebookCreate(BaseModel):
     name: str
     parent_id: Optional[int] = None
 
+class NotebookUpdate(BaseModel):
+    name: Optional[str] = None
+    parent_id: Optional[int] = None
+
 class NotebookRead(BaseModel):
     id: int
     name: str
@@ -24,6 +30,39 @@ class QuestionImportItem(BaseModel):
 class QuestionImport(BaseModel):
     questions: List[QuestionImportItem]
 
+class StreamImportError(BaseModel):
+    index: int # Position of the item in the stream, -1 when the stream itself is malformed
+    error: str
+
+class StreamImportResult(BaseModel):
+    imported: int
+    skipped: int = 0 # Duplicates of questions already in the notebook
+    failed: int
+    errors: List[StreamImportError] = [] # Capped, see IngestService.MAX_REPORTED_ERRORS
+
+# Study Session Schemas
+class StudySessionCreate(BaseModel):
+    notebook_id: int
+    mode: str = Field("all", pattern="^(all|incorrect|unresolved)$")
+    randomize: bool = False
+    seed: Optional[int] = None
+    count: Optional[int] = Field(None, ge=1, le=1000) # Random sample of this size instead of the whole set
+
+class StudySessionUpdate(BaseModel):
+    position: int = Field(ge=0)
+
+class StudySessionRead(BaseModel):
+    id: str
+    notebook_id: int
+    mode: str
+    seed: Optional[int]
+    total: int
+    position: int
+
+class StudySessionItem(BaseModel):
+    position: int
+    question: Question
+
 # Attempt Schemas
 class AttemptCreate(BaseModel):
     question_id: int
@@ -34,6 +73,22 @@ class AttemptResponse(BaseModel):
     correct_answer: str
     explanation: str
 
+class AttemptBatchItem(AttemptCreate):
+    # When the answer was given on the client; defaults to the time the batch is received
+    answered_at: Optional[datetime] = None
+
+class AttemptBatch(BaseModel):
+    attempts: List[AttemptBatchItem] = Field(min_length=1, max_length=1000)
+
+class AttemptBatchResult(BaseModel):
+    """Grading of one batch item; result is None when the question does not exist."""
+    question_id: int
+    result: Optional[AttemptResponse] = None
+
+class AttemptBatchResponse(BaseModel):
+    recorded: int
+    results: List[AttemptBatchResult]
+
 from typing import Dict
 
 # Stats Schema
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.database import engine
+from app.schemas import AttemptBatchItem
+from app.services.question_service import AsyncQuestionService, QuestionService
+
+class AttemptWriter:
+    """Write-behind recording of attempts.
+
+    Answers are graded from the answer-key cache and queued; a background thread collects
+    what arrives within flush_interval seconds (at most max_batch attempts) and records it in
+    one transaction with QuestionService.submit_attempts, keeping the time each answer was
+    given. Stats reflect an attempt once its batch is committed. stop() writes everything
+    still queued before returning.
+    """
+    WRITE_RETRIES = 3
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        flush_interval: float = 0.005,
+        max_batch: int = 500,
+        max_queue: int = 10000
+    ):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.written = 0
+        self.failed = 0
+        self._queue: "queue.Queue[Optional[AttemptBatchItem]]" = queue.Queue(maxsize=max_queue)
+        self._in_flight = 0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    @property
+    def depth(self) -> int:
+        """Attempts accepted but not yet committed."""
+        return self._queue.qsize() + self._in_flight
+
+    def start(self):
+        if not self.running:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="attempt-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write every queued attempt, then stop the writer thread."""
+        if self._thread is not None:
+            self._stopping = True
+            # FIFO: everything queued before the sentinel is written before the thread exits
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+            # Attempts that slipped in while the sentinel was being queued
+            leftover = []
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            if leftover:
+                self._write(leftover)
+
+    def flush(self):
+        """Block until every attempt queued so far has been written."""
+        self._queue.join()
+
+    async def submit_attempt(self, session: AsyncSession, question_id: int, selected_option: str) -> Optional[dict]:
+        """Grade an answer from the answer key and queue its Attempt; None if the question does not exist.
+
+        Falls back to the synchronous path when the writer is not running or its queue is full.
+        """
+        if not self.running:
+            return await AsyncQuestionService.submit_attempt(session, question_id, selected_option)
+        key = await AsyncQuestionService.get_answer_key(session, question_id)
+        if key is None:
+            return None
+        item = AttemptBatchItem(
+            question_id=question_id, selected_option=selected_option, answered_at=datetime.now(timezone.utc)
+        )
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return await AsyncQuestionService.submit_attempt(session, question_id, selected_option)
+        return {
+            "is_correct": selected_option == key.correct_answer,
+            "correct_answer": key.correct_answer,
+            "explanation": key.explanation
+        }
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._write(batch)
+            self._in_flight = 0
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+
+    def _collect(self):
+        """Block for the next attempt, then take whatever arrives within flush_interval, up to max_batch.
+
+        Returns (batch, stop) where stop means the shutdown sentinel was reached.
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        self._in_flight = 1
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            self._in_flight += 1
+        return batch, False
+
+    def _write(self, batch: List[AttemptBatchItem]):
+        for attempt in range(1, self.WRITE_RETRIES + 1):
+            try:
+                with self.session_factory() as session:
+                    results = QuestionService.submit_attempts(session, batch)
+                # Attempts on questions deleted in the meantime are dropped by submit_attempts
+                self.written += sum(result is not None for result in results)
+                return
+            except Exception as e:
+                print(f"Attempt writer: writing {len(batch)} attempts failed ({attempt}/{self.WRITE_RETRIES}): {e}")
+                time.sleep(0.1 * attempt)
+        self.failed += len(batch)
+
+# Opt in with ATTEMPT_WRITE_BEHIND=1; otherwise submit_attempt always commits before answering
+WRITE_BEHIND_ENABLED = os.getenv("ATTEMPT_WRITE_BEHIND", "0") == "1"
+
+attempt_writer = AttemptWriter(lambda: Session(engine))
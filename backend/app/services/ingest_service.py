@@ -0,0 +1,148 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, List, Tuple
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.schemas import QuestionImportItem, StreamImportError, StreamImportResult
+from app.services.question_service import AsyncQuestionService
+
+class IngestError(ValueError):
+    """The stream itself is malformed and parsing cannot continue."""
+
+class IngestService:
+    MAX_ITEM_CHARS = 1_000_000
+    MAX_REPORTED_ERRORS = 100
+
+    @staticmethod
+    async def iter_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+        """Incrementally parse an NDJSON stream or a top-level JSON array.
+
+        Yields (index, value) for each item, where value is the decoded JSON or the
+        JSONDecodeError of an unparseable NDJSON line (the remaining lines are still read).
+        The format is detected from the first non-whitespace character.
+        """
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        json_decoder = json.JSONDecoder()
+        buffer = ""
+        # NDJSON: the unfinished last line, kept as the pieces received so far
+        partial: List[str] = []
+        partial_chars = 0
+        mode = None  # "array" or "ndjson"
+        index = 0
+        finished = False
+        eof = False
+        chunk_iter = chunks.__aiter__()
+
+        while not finished:
+            try:
+                chunk = await chunk_iter.__anext__()
+                text = decoder.decode(chunk)
+            except StopAsyncIteration:
+                text = decoder.decode(b"", final=True)
+                eof = True
+
+            if mode is None:
+                text = text.lstrip()
+                if not text:
+                    if eof:
+                        return
+                    continue
+                if text[0] == "[":
+                    mode = "array"
+                    text = text[1:]
+                else:
+                    mode = "ndjson"
+
+            if mode == "ndjson":
+                # Only the newly received text is split; earlier lines are already out
+                *lines, rest = text.split("\n")
+                if lines:
+                    lines[0] = "".join(partial) + lines[0]
+                    partial, partial_chars = [], 0
+                partial.append(rest)
+                partial_chars += len(rest)
+                if eof:
+                    lines.append("".join(partial))
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield index, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield index, e
+                    index += 1
+                if partial_chars > IngestService.MAX_ITEM_CHARS:
+                    raise IngestError(f"Item {index} exceeds {IngestService.MAX_ITEM_CHARS} characters")
+                finished = eof
+            else:
+                buffer += text
+                while True:
+                    buffer = buffer.lstrip()
+                    if buffer.startswith("]"):
+                        finished = True
+                        break
+                    if buffer.startswith(","):
+                        buffer = buffer[1:].lstrip()
+                    try:
+                        value, end = json_decoder.raw_decode(buffer)
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise IngestError(f"Malformed JSON array near item {index}")
+                        if len(buffer) > IngestService.MAX_ITEM_CHARS:
+                            raise IngestError(f"Item {index} exceeds {IngestService.MAX_ITEM_CHARS} characters")
+                        break
+                    # A value touching the end of the buffer may still be incomplete (e.g. a number)
+                    if end == len(buffer) and not eof:
+                        break
+                    yield index, value
+                    index += 1
+                    buffer = buffer[end:]
+                if eof and not finished:
+                    raise IngestError("Unterminated JSON array")
+
+    @staticmethod
+    async def ingest(
+        session: AsyncSession,
+        notebook_id: int,
+        chunks: AsyncIterator[bytes],
+        batch_size: int,
+        on_duplicate: str = "skip"
+    ) -> StreamImportResult:
+        """Validate streamed items one by one and insert them in batches of batch_size.
+
+        Invalid items are reported and skipped; only the current batch is kept in memory.
+        """
+        result = StreamImportResult(imported=0, skipped=0, failed=0, errors=[])
+        batch: List[QuestionImportItem] = []
+
+        def record_error(index: int, message: str):
+            result.failed += 1
+            if len(result.errors) < IngestService.MAX_REPORTED_ERRORS:
+                result.errors.append(StreamImportError(index=index, error=message))
+
+        async def flush():
+            if batch:
+                ids = await AsyncQuestionService.bulk_insert_questions(session, notebook_id, batch, on_duplicate)
+                result.imported += len(ids)
+                result.skipped += len(batch) - len(ids)
+                batch.clear()
+
+        try:
+            async for index, value in IngestService.iter_items(chunks):
+                if isinstance(value, json.JSONDecodeError):
+                    record_error(index, f"Invalid JSON: {value.msg}")
+                    continue
+                try:
+                    batch.append(QuestionImportItem.model_validate(value))
+                except ValidationError as e:
+                    record_error(index, "; ".join(
+                        f"{'.'.join(str(loc) for loc in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+                    ))
+                    continue
+                if len(batch) >= batch_size:
+                    await flush()
+        except IngestError as e:
+            record_error(-1, str(e))
+
+        await flush()
+        return result
@@ -1,13 +1,33 @@
-from sqlmodel import Session, select
-from app.models import Notebook
-from app.schemas import NotebookCreate, NotebookRead
-from typing import List, Optional
+from sqlmodel import Session, select, delete, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import case, insert, literal, true, update
+from sqlalchemy.orm import aliased
+from app.core.cache import answer_key_cache, stats_cache
+from app.models import Attempt, DailyActivity, Notebook, NotebookClosure, NotebookCounter, Question, QuestionStatus, StudySession
+from app.schemas import NotebookCreate, NotebookRead, NotebookUpdate
+from typing import Dict, List, Optional, Tuple
 
 class NotebookService:
     @staticmethod
-    def create(session: Session, notebook: NotebookCreate) -> Notebook:
+    def create(session: Session, notebook: NotebookCreate) -> Optional[Notebook]:
+        if notebook.parent_id is not None and not session.get(Notebook, notebook.parent_id):
+            return None
+
         db_notebook = Notebook.model_validate(notebook)
         session.add(db_notebook)
+        session.flush()
+
+        # The new notebook is its own depth-0 ancestor and inherits every ancestor of its parent
+        session.add(NotebookClosure(ancestor_id=db_notebook.id, descendant_id=db_notebook.id, depth=0))
+        session.add(NotebookCounter(notebook_id=db_notebook.id))
+        if db_notebook.parent_id is not None:
+            session.execute(
+                insert(NotebookClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(NotebookClosure.ancestor_id, literal(db_notebook.id), NotebookClosure.depth + 1)
+                    .where(NotebookClosure.descendant_id == db_notebook.parent_id),
+                )
+            )
         session.commit()
         session.refresh(db_notebook)
         return db_notebook
@@ -31,11 +51,271 @@ class NotebookService:
     def get_by_id(session: Session, notebook_id: int) -> Optional[Notebook]:
         return session.get(Notebook, notebook_id)
 
+    @staticmethod
+    def get_ancestors(session: Session, notebook_id: int) -> List[Notebook]:
+        """Breadcrumb path from the root down to (and including) the notebook."""
+        statement = (
+            select(Notebook)
+            .join(NotebookClosure, NotebookClosure.ancestor_id == Notebook.id)
+            .where(NotebookClosure.descendant_id == notebook_id)
+            .order_by(NotebookClosure.depth.desc())
+        )
+        return list(session.exec(statement).all())
+
+    @staticmethod
+    def get_ancestor_ids(session: Session, notebook_id: int) -> List[int]:
+        """The notebook's id and the ids of all its ancestors."""
+        return list(session.exec(
+            select(NotebookClosure.ancestor_id).where(NotebookClosure.descendant_id == notebook_id)
+        ).all())
+
+    @staticmethod
+    def invalidate_stats(session: Session, notebook_id: int):
+        """Drop cached stats of the notebook and its ancestor chain (call after committing)."""
+        stats_cache.invalidate(NotebookService.get_ancestor_ids(session, notebook_id))
+
+    @staticmethod
+    def subtree_ids_query(notebook_id: int):
+        """SELECT of the notebook's id plus every descendant id, read from the closure table.
+
+        Meant to be used inside other queries, e.g. ``Question.notebook_id.in_(...)``.
+        """
+        return select(NotebookClosure.descendant_id).where(NotebookClosure.ancestor_id == notebook_id)
+
+    @staticmethod
+    def get_subtree_ids(session: Session, notebook_id: int) -> List[int]:
+        return list(session.exec(NotebookService.subtree_ids_query(notebook_id)).all())
+
+    @staticmethod
+    def move(session: Session, notebook_id: int, new_parent_id: Optional[int]) -> Optional[Notebook]:
+        """Re-parent a notebook (None moves it to the root), rewiring the closure rows of its subtree.
+
+        Raises ValueError when the new parent does not exist or lies inside the moved subtree.
+        """
+        notebook = session.get(Notebook, notebook_id)
+        if not notebook:
+            return None
+
+        subtree_ids = NotebookService.get_subtree_ids(session, notebook_id)
+        if new_parent_id is not None:
+            if not session.get(Notebook, new_parent_id):
+                raise ValueError("Parent notebook not found")
+            if new_parent_id in subtree_ids:
+                raise ValueError("A notebook cannot be moved inside itself")
+
+        old_chain = NotebookService.get_ancestor_ids(session, notebook_id)
+
+        # The subtree's questions stop counting towards the old ancestors and count towards the new ones
+        counter = session.get(NotebookCounter, notebook_id) or NotebookCounter(notebook_id=notebook_id)
+        moved = (counter.total, counter.attempted, counter.correct)
+        NotebookService.adjust_counters(session, notebook_id, *(-n for n in moved), include_self=False)
+
+        # Detach the subtree from its old ancestors (keeping the links inside the subtree)
+        old_ancestor_ids = select(NotebookClosure.ancestor_id).where(
+            NotebookClosure.descendant_id == notebook_id, NotebookClosure.depth > 0
+        )
+        session.execute(
+            delete(NotebookClosure).where(
+                NotebookClosure.descendant_id.in_(subtree_ids),
+                NotebookClosure.ancestor_id.in_(old_ancestor_ids),
+            )
+        )
+
+        # Attach it under every ancestor of the new parent
+        if new_parent_id is not None:
+            above = aliased(NotebookClosure)
+            below = aliased(NotebookClosure)
+            session.execute(
+                insert(NotebookClosure).from_select(
+                    ["ancestor_id", "descendant_id", "depth"],
+                    select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+                    .select_from(above)
+                    .join(below, true())
+                    .where(above.descendant_id == new_parent_id, below.ancestor_id == notebook_id),
+                )
+            )
+        NotebookService.adjust_counters(session, notebook_id, *moved, include_self=False)
+
+        notebook.parent_id = new_parent_id
+        session.add(notebook)
+        session.commit()
+        stats_cache.invalidate(old_chain)
+        NotebookService.invalidate_stats(session, notebook_id)
+        session.refresh(notebook)
+        return notebook
+
+    @staticmethod
+    def update(session: Session, notebook_id: int, data: NotebookUpdate) -> Optional[Notebook]:
+        """Rename and/or re-parent a notebook. Only fields present in the request are applied."""
+        notebook = session.get(Notebook, notebook_id)
+        if not notebook:
+            return None
+        if "parent_id" in data.model_fields_set and data.parent_id != notebook.parent_id:
+            notebook = NotebookService.move(session, notebook_id, data.parent_id)
+        if data.name is not None and data.name != notebook.name:
+            notebook.name = data.name
+            session.add(notebook)
+            session.commit()
+            # Global stats name each root notebook's category
+            stats_cache.invalidate([notebook_id])
+            session.refresh(notebook)
+        return notebook
+
+    @staticmethod
+    def rebuild_closure(session: Session) -> int:
+        """Recompute the closure table from parent_id links (backfill for existing trees)."""
+        tree = select(
+            Notebook.id.label("ancestor_id"),
+            Notebook.id.label("descendant_id"),
+            literal(0).label("depth"),
+        ).cte("tree", recursive=True)
+        tree = tree.union_all(
+            select(tree.c.ancestor_id, Notebook.id, tree.c.depth + 1)
+            .where(Notebook.parent_id == tree.c.descendant_id)
+        )
+
+        session.execute(delete(NotebookClosure))
+        session.execute(
+            insert(NotebookClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth),
+            )
+        )
+        session.commit()
+        NotebookService.rebuild_counters(session)
+        return session.exec(select(func.count()).select_from(NotebookClosure)).one()
+
+    @staticmethod
+    def adjust_counters(
+        session: Session,
+        notebook_id: int,
+        total: int = 0,
+        attempted: int = 0,
+        correct: int = 0,
+        include_self: bool = True
+    ):
+        """Add the deltas to the counters of the notebook's ancestors, and the notebook itself
+        unless include_self is False, in a single UPDATE (caller commits)."""
+        if not (total or attempted or correct):
+            return
+        ancestor_ids = select(NotebookClosure.ancestor_id).where(NotebookClosure.descendant_id == notebook_id)
+        if not include_self:
+            ancestor_ids = ancestor_ids.where(NotebookClosure.depth > 0)
+        session.execute(
+            update(NotebookCounter)
+            .where(NotebookCounter.notebook_id.in_(ancestor_ids))
+            .values(
+                total=NotebookCounter.total + total,
+                attempted=NotebookCounter.attempted + attempted,
+                correct=NotebookCounter.correct + correct,
+            )
+        )
+
+    @staticmethod
+    def _counter_query():
+        """(notebook_id, total, attempted, correct) for every notebook, recomputed from the raw tables."""
+        return (
+            select(
+                NotebookClosure.ancestor_id,
+                func.count(Question.id),
+                func.count(QuestionStatus.question_id),
+                func.coalesce(func.sum(case((QuestionStatus.last_is_correct == True, 1), else_=0)), 0),
+            )
+            .select_from(NotebookClosure)
+            .outerjoin(Question, Question.notebook_id == NotebookClosure.descendant_id)
+            .outerjoin(QuestionStatus, QuestionStatus.question_id == Question.id)
+            .group_by(NotebookClosure.ancestor_id)
+        )
+
+    @staticmethod
+    def rebuild_counters(session: Session) -> int:
+        """Recompute every NotebookCounter row from the questions, statuses and closure table."""
+        session.execute(delete(NotebookCounter))
+        session.execute(
+            insert(NotebookCounter).from_select(
+                ["notebook_id", "total", "attempted", "correct"],
+                NotebookService._counter_query(),
+            )
+        )
+        session.commit()
+        return session.exec(select(func.count()).select_from(NotebookCounter)).one()
+
+    @staticmethod
+    def check_counters(session: Session) -> Dict[int, Tuple[Tuple[int, int, int], Tuple[int, int, int]]]:
+        """Compare stored counters with a fresh recount.
+
+        Returns {notebook_id: (stored, actual)} for every notebook whose (total, attempted, correct)
+        differ or whose counter row is missing (reported as stored zeros).
+        """
+        stored = {
+            c.notebook_id: (c.total, c.attempted, c.correct)
+            for c in session.exec(select(NotebookCounter)).all()
+        }
+        actual = {
+            notebook_id: (total, attempted, correct)
+            for notebook_id, total, attempted, correct in session.execute(NotebookService._counter_query()).all()
+        }
+        drift = {}
+        for notebook_id in sorted(stored.keys() | actual.keys()):
+            if notebook_id not in stored or stored[notebook_id] != actual.get(notebook_id, (0, 0, 0)):
+                drift[notebook_id] = (stored.get(notebook_id, (0, 0, 0)), actual.get(notebook_id, (0, 0, 0)))
+        return drift
+
     @staticmethod
     def delete(session: Session, notebook_id: int):
+        """Delete a notebook with its whole subtree, their questions, attempts and derived rows."""
         notebook = session.get(Notebook, notebook_id)
         if notebook:
-            session.delete(notebook)
+            subtree_ids = NotebookService.get_subtree_ids(session, notebook_id)
+            ancestor_ids = NotebookService.get_ancestor_ids(session, notebook_id)
+            counter = session.get(NotebookCounter, notebook_id)
+            if counter:
+                NotebookService.adjust_counters(
+                    session, notebook_id, -counter.total, -counter.attempted, -counter.correct, include_self=False
+                )
+            # Everything hanging off the subtree, children first, one set-based DELETE per table
+            question_ids = select(Question.id).where(Question.notebook_id.in_(subtree_ids))
+            session.execute(delete(Attempt).where(Attempt.question_id.in_(question_ids)))
+            session.execute(delete(QuestionStatus).where(QuestionStatus.question_id.in_(question_ids)))
+            session.execute(delete(Question).where(Question.notebook_id.in_(subtree_ids)))
+            session.execute(delete(NotebookCounter).where(NotebookCounter.notebook_id.in_(subtree_ids)))
+            session.execute(delete(DailyActivity).where(DailyActivity.notebook_id.in_(subtree_ids)))
+            session.execute(delete(StudySession).where(StudySession.notebook_id.in_(subtree_ids)))
+            session.execute(delete(NotebookClosure).where(NotebookClosure.descendant_id.in_(subtree_ids)))
+            session.execute(delete(Notebook).where(Notebook.id.in_(subtree_ids)))
             session.commit()
+            stats_cache.invalidate(ancestor_ids + subtree_ids)
+            deleted = set(subtree_ids)
+            answer_key_cache.discard_where(lambda key: key.notebook_id in deleted)
             return True
         return False
+
+class AsyncNotebookService:
+    """Async twin of NotebookService.
+
+    Each call runs the sync implementation through AsyncSession.run_sync, i.e. on the async
+    driver's connection, so route handlers await the database instead of holding a worker thread.
+    """
+    @staticmethod
+    async def create(session: AsyncSession, notebook: NotebookCreate) -> Optional[Notebook]:
+        return await session.run_sync(NotebookService.create, notebook)
+
+    @staticmethod
+    async def get_all(session: AsyncSession) -> List[NotebookRead]:
+        return await session.run_sync(NotebookService.get_all)
+
+    @staticmethod
+    async def get_by_id(session: AsyncSession, notebook_id: int) -> Optional[Notebook]:
+        return await session.get(Notebook, notebook_id)
+
+    @staticmethod
+    async def get_ancestors(session: AsyncSession, notebook_id: int) -> List[Notebook]:
+        return await session.run_sync(NotebookService.get_ancestors, notebook_id)
+
+    @staticmethod
+    async def update(session: AsyncSession, notebook_id: int, data: NotebookUpdate) -> Optional[Notebook]:
+        return await session.run_sync(NotebookService.update, notebook_id, data)
+
+    @staticmethod
+    async def delete(session: AsyncSession, notebook_id: int):
+        return await session.run_sync(NotebookService.delete, notebook_id)
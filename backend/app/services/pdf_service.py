@@ -1,31 +1,214 @@
-import io
-import zipfile
+import asyncio
+import multiprocessing
+import os
+import shutil
 import sys
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
 from pypdf import PdfReader, PdfWriter
 
+# Processes rendering chunks in parallel; 1 keeps splitting in the calling process
+PDF_SPLIT_WORKERS = int(os.getenv("PDF_SPLIT_WORKERS", str(os.cpu_count() or 1)))
+# Pages rendered through one PdfReader before a fresh one is opened
+PAGES_PER_READER = 500
+# Splits run at once, and splits allowed to wait for one of those slots before requests are turned away
+PDF_SPLIT_CONCURRENCY = int(os.getenv("PDF_SPLIT_CONCURRENCY", "2"))
+PDF_SPLIT_QUEUE = int(os.getenv("PDF_SPLIT_QUEUE", "8"))
+# Deeply nested PDFs overflow Python's default of 1000 while being parsed
+PDF_RECURSION_LIMIT = 5000
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_size = 0
+_process_pool_lock = threading.Lock()
+
 class PdfService:
+    """Splits PDFs entirely on disk: the source is read from a file, every chunk is written to
+    a temporary file and streamed into the ZIP, so memory stays bounded by one run of chunks
+    per worker."""
+
+    @staticmethod
+    def make_workdir() -> str:
+        """A private temporary directory for one split; remove it with cleanup()."""
+        return tempfile.mkdtemp(prefix="split-pdf-")
+
+    @staticmethod
+    def cleanup(workdir: str):
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    @staticmethod
+    def chunk_ranges(total_pages: int, chunk_size: int) -> List[Tuple[int, int]]:
+        """[start, end) page ranges of chunk_size pages each."""
+        return [(start, min(start + chunk_size, total_pages)) for start in range(0, total_pages, chunk_size)]
+
+    @staticmethod
+    def chunk_name(start: int, end: int) -> str:
+        return f"split_{start+1}-{end}.pdf"
+
+    @staticmethod
+    def page_count(source_path: str) -> int:
+        with open(source_path, "rb") as source:
+            return len(PdfReader(source).pages)
+
     @staticmethod
-    def split_pdf(file_bytes: bytes, chunk_size: int) -> bytes:
-        # Increase recursion limit for complex PDFs
-        sys.setrecursionlimit(5000)
-        
-        reader = PdfReader(io.BytesIO(file_bytes))
-        total_pages = len(reader.pages)
-        
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-            for start in range(0, total_pages, chunk_size):
-                end = min(start + chunk_size, total_pages)
-                
+    def write_chunks(source_path: str, ranges: List[Tuple[int, int]], out_paths: List[str]):
+        """Write pages [start, end) of the PDF at source_path to a new PDF at out_path, for each range.
+
+        The ranges share one reader over an open file: given a path, pypdf would read the whole
+        file into memory, and every new reader walks the full page tree again. A reader caches
+        every object it resolves, so callers keep each call to a bounded number of pages.
+        """
+        with open(source_path, "rb") as source:
+            reader = PdfReader(source)
+            for (start, end), out_path in zip(ranges, out_paths):
                 writer = PdfWriter()
                 for i in range(start, end):
                     writer.add_page(reader.pages[i])
-                
-                pdf_buffer = io.BytesIO()
-                writer.write(pdf_buffer)
-                
-                file_name = f"split_{start+1}-{end}.pdf"
-                zip_file.writestr(file_name, pdf_buffer.getvalue())
-        
-        return zip_buffer.getvalue()
+                writer.write(out_path)
+
+    @staticmethod
+    def chunk_runs(ranges: List[Tuple[int, int]], chunk_size: int, workers: int) -> List[List[Tuple[int, int]]]:
+        """Group consecutive chunks into runs read by one reader: at most PAGES_PER_READER pages each,
+        and small enough that every worker gets a run."""
+        per_run = max(1, min(PAGES_PER_READER // chunk_size, -(-len(ranges) // workers)))
+        return [ranges[i:i + per_run] for i in range(0, len(ranges), per_run)]
+
+    @staticmethod
+    def split_pdf(source_path: str, chunk_size: int, zip_path: str, workers: Optional[int] = None) -> int:
+        """Split the PDF at source_path into chunk_size-page PDFs zipped at zip_path; returns the chunk count.
+
+        Runs of chunks are rendered by up to workers processes (PDF_SPLIT_WORKERS by default; 1
+        renders in this process) and added to the ZIP in page order as they complete.
+        """
+        sys.setrecursionlimit(PDF_RECURSION_LIMIT)
+
+        ranges = PdfService.chunk_ranges(PdfService.page_count(source_path), chunk_size)
+        workers = max(1, min(workers or PDF_SPLIT_WORKERS, len(ranges)))
+        runs = PdfService.chunk_runs(ranges, chunk_size, workers)
+        paths = [[f"{zip_path}.{start}.pdf" for start, _ in run] for run in runs]
+
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as zip_file:
+            def add(run: List[Tuple[int, int]], chunk_paths: List[str]):
+                for (start, end), chunk_path in zip(run, chunk_paths):
+                    # ZipFile.write streams the file in blocks rather than reading it whole
+                    zip_file.write(chunk_path, PdfService.chunk_name(start, end))
+                    os.remove(chunk_path)
+
+            if workers == 1:
+                for run, chunk_paths in zip(runs, paths):
+                    PdfService.write_chunks(source_path, run, chunk_paths)
+                    add(run, chunk_paths)
+            else:
+                # Workers open the source themselves; only paths and page numbers are pickled
+                pool = PdfService._pool(workers)
+                futures = [
+                    pool.submit(PdfService.write_chunks, source_path, run, chunk_paths)
+                    for run, chunk_paths in zip(runs, paths)
+                ]
+                try:
+                    for future, run, chunk_paths in zip(futures, runs, paths):
+                        future.result()
+                        add(run, chunk_paths)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory); the next split starts a fresh pool
+                    PdfService._discard_pool(pool)
+                    raise
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+        return len(ranges)
+
+    @staticmethod
+    def _pool(workers: int) -> ProcessPoolExecutor:
+        """Process pool shared by all splits, created on first use and grown if more workers are asked for."""
+        global _process_pool, _process_pool_size
+        with _process_pool_lock:
+            if _process_pool is None or _process_pool_size < workers:
+                if _process_pool is not None:
+                    _process_pool.shutdown(wait=False)
+                # spawn, not fork: the API process runs threads (e.g. the attempt writer). Spawned
+                # workers start with the default recursion limit, so they raise it themselves.
+                _process_pool = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=sys.setrecursionlimit,
+                    initargs=(PDF_RECURSION_LIMIT,),
+                )
+                _process_pool_size = workers
+            return _process_pool
+
+    @staticmethod
+    def _discard_pool(pool: ProcessPoolExecutor):
+        global _process_pool, _process_pool_size
+        with _process_pool_lock:
+            if _process_pool is pool:
+                _process_pool, _process_pool_size = None, 0
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def shutdown():
+        """Stop the worker processes, if any were started."""
+        global _process_pool, _process_pool_size
+        with _process_pool_lock:
+            pool, _process_pool, _process_pool_size = _process_pool, None, 0
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+class SplitQueueFull(Exception):
+    """Raised by SplitQueue.slot() when max_running splits are running and max_waiting more are queued."""
+
+class SplitQueue:
+    """Runs PDF splits off the event loop, at most max_running at a time.
+
+    A request takes a slot() before spooling its upload and holds it until its split is done,
+    so at most max_running + max_waiting splits are accepted at once; beyond that slot() raises
+    SplitQueueFull. Slots are only taken and released on the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_running: int = PDF_SPLIT_CONCURRENCY, max_waiting: int = PDF_SPLIT_QUEUE):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        # With PDF_SPLIT_WORKERS > 1 these threads only wait on the process pool; with 1 they render
+        # the pages themselves and the event loop still gets the GIL every few milliseconds
+        self._executor = ThreadPoolExecutor(max_running, thread_name_prefix="pdf-split")
+
+    @contextmanager
+    def slot(self):
+        if self.in_flight >= self.max_running + self.max_waiting:
+            self.rejected += 1
+            raise SplitQueueFull()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def split_pdf(self, source_path: str, chunk_size: int, zip_path: str) -> int:
+        """PdfService.split_pdf on one of the executor's threads."""
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(self._executor, PdfService.split_pdf, source_path, chunk_size, zip_path)
+        self.completed += 1
+        return chunks
+
+    def info(self) -> dict:
+        return {
+            "running": min(self.in_flight, self.max_running),
+            "waiting": max(0, self.in_flight - self.max_running),
+            "max_running": self.max_running,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+split_queue = SplitQueue()
@@ -1,72 +1,368 @@
-from sqlmodel import Session, select
-from app.models import Notebook, Question, Attempt
-from app.schemas import QuestionImport
-from typing import List
+from sqlmodel import Session, select, delete, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import Question, Attempt, DailyActivity, Notebook, NotebookCounter, QuestionStatus, utc_now
+from app.schemas import AttemptBatchItem, QuestionImportItem
+from app.core.cache import answer_key_cache
+from app.services.notebook_service import NotebookService
+from sqlalchemy import Date, Integer, cast, column, insert, literal_column, table, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.util import await_only
+from datetime import date, datetime, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+import csv
+import hashlib
+import io
+import json
+import math
 import random
+import unicodedata
+
+class AnswerKey(NamedTuple):
+    """What grading an answer needs; a question's notebook never changes, so it is cached too."""
+    correct_answer: str
+    explanation: str
+    notebook_id: int
 
 class QuestionService:
+    BULK_CHUNK_SIZE = 5000
+    IMPORT_COLUMNS = ["notebook_id", "content", "type", "language", "options", "correct_answer", "explanation", "content_hash"]
+    UPSERT_COLUMNS = ["content", "type", "language", "options", "correct_answer", "explanation"]
+    DUPLICATE_MODES = ["skip", "upsert"]
+
     @staticmethod
-    def upload_questions(session: Session, notebook_id: int, data: QuestionImport) -> int:
-        count = 0
-        for q in data.questions:
-            db_question = Question(
-                notebook_id=notebook_id,
-                content=q.content,
-                type=q.type,
-                language=q.language,
-                options=q.options,
-                correct_answer=q.correct_answer,
-                explanation=q.explanation
-            )
-            session.add(db_question)
-            count += 1
-        
+    def content_hash(question) -> str:
+        """Normalized SHA-256 of a question's language, content, options and correct answer.
+
+        Case, Unicode form and whitespace are normalized and option order is ignored, so
+        regenerated copies of the same question hash identically within a language.
+        """
+        def normalize(value: str) -> str:
+            return " ".join(unicodedata.normalize("NFKC", value).casefold().split())
+
+        payload = json.dumps(
+            [
+                normalize(question.language),
+                normalize(question.content),
+                sorted(normalize(option) for option in question.options),
+                normalize(question.correct_answer),
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def bulk_insert_questions(
+        session: Session,
+        notebook_id: int,
+        items: List[QuestionImportItem],
+        on_duplicate: str = "skip"
+    ) -> List[int]:
+        """Insert many questions without building ORM objects and return the written ids in input order.
+
+        Questions whose content hash already exists in the notebook are skipped, or overwritten
+        when on_duplicate is "upsert". Uses COPY into a staging table on Postgres and a
+        multi-row INSERT ... ON CONFLICT ... RETURNING everywhere else.
+        """
+        rows_by_hash = {}
+        for q in items:
+            content_hash = QuestionService.content_hash(q)
+            if on_duplicate == "skip" and content_hash in rows_by_hash:
+                continue
+            rows_by_hash[content_hash] = {
+                "notebook_id": notebook_id,
+                "content": q.content,
+                "type": q.type,
+                "language": q.language,
+                "options": q.options,
+                "correct_answer": q.correct_answer,
+                "explanation": q.explanation,
+                "content_hash": content_hash,
+            }
+        rows = list(rows_by_hash.values())
+        if not rows:
+            return []
+
+        write_chunk = QuestionService._copy_rows if session.get_bind().dialect.name == "postgresql" else QuestionService._insert_rows
+        written = {}
+        inserted = 0
+        for start in range(0, len(rows), QuestionService.BULK_CHUNK_SIZE):
+            chunk = rows[start:start + QuestionService.BULK_CHUNK_SIZE]
+            for question_id, content_hash, is_new in write_chunk(session, chunk, on_duplicate):
+                written[content_hash] = question_id
+                inserted += bool(is_new)
+        # Upserts also return the ids of overwritten questions; only new rows add to the counters
+        NotebookService.adjust_counters(session, notebook_id, total=inserted)
+
+        ids = [written[row["content_hash"]] for row in rows if row["content_hash"] in written]
         session.commit()
-        return count
+        NotebookService.invalidate_stats(session, notebook_id)
+        if on_duplicate == "upsert":
+            # Overwritten questions may have a new correct answer. Evicted after the commit, so a
+            # grading in between cannot re-cache the old one.
+            for question_id in ids:
+                answer_key_cache.discard(question_id)
+        return ids
 
     @staticmethod
-    def get_study_questions(session: Session, notebook_id: int, mode: str, randomize: bool) -> List[Question]:
-        all_notebooks = session.exec(select(Notebook)).all()
-        ids_to_fetch = {notebook_id}
-        
-        queue = [notebook_id]
-        while queue:
-            current = queue.pop(0)
-            children = [n.id for n in all_notebooks if n.parent_id == current]
-            ids_to_fetch.update(children)
-            queue.extend(children)
-            
-        query = select(Question).where(Question.notebook_id.in_(ids_to_fetch))
-        questions = session.exec(query).all()
-        
-        filtered_questions = []
-        
-        for q in questions:
-            latest_attempt = session.exec(
-                select(Attempt).where(Attempt.question_id == q.id).order_by(Attempt.timestamp.desc())
-            ).first()
-            
-            status = "unresolved"
-            if latest_attempt:
-                status = "correct" if latest_attempt.is_correct else "incorrect"
-                
-            if mode == "all":
-                filtered_questions.append(q)
-            elif mode == "incorrect" and status == "incorrect":
-                filtered_questions.append(q)
-            elif mode == "unresolved" and status == "unresolved":
-                filtered_questions.append(q)
-                
+    def _on_conflict(statement, on_duplicate: str):
+        index_elements = ["notebook_id", "content_hash"]
+        if on_duplicate == "upsert":
+            return statement.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: statement.excluded[column] for column in QuestionService.UPSERT_COLUMNS},
+            )
+        return statement.on_conflict_do_nothing(index_elements=index_elements)
+
+    @staticmethod
+    def _insert_rows(session: Session, rows: List[dict], on_duplicate: str):
+        """Write rows with INSERT ... ON CONFLICT and return (id, content_hash, inserted) for each row written."""
+        existing = set()
+        if on_duplicate == "upsert":
+            # SQLite can't tell an inserted row from an updated one in RETURNING, so look the hashes up first
+            existing = set(session.exec(
+                select(Question.content_hash).where(
+                    Question.notebook_id == rows[0]["notebook_id"],
+                    Question.content_hash.in_([row["content_hash"] for row in rows]),
+                )
+            ).all())
+        statement = QuestionService._on_conflict(sqlite_insert(Question), on_duplicate)
+        written = session.execute(statement.returning(Question.id, Question.content_hash), rows).all()
+        return [(question_id, content_hash, content_hash not in existing) for question_id, content_hash in written]
+
+    @staticmethod
+    def _copy_rows(session: Session, rows: List[dict], on_duplicate: str):
+        """Write rows through COPY and INSERT ... SELECT; returns (id, content_hash, inserted) like _insert_rows."""
+        # COPY cannot resolve conflicts or return keys, so stream into a staging table first
+        session.execute(text(
+            "CREATE TEMP TABLE IF NOT EXISTS question_import ("
+            "notebook_id integer, content text, type text, language text, options json, "
+            "correct_answer text, explanation text, content_hash text) ON COMMIT DELETE ROWS"
+        ))
+        session.execute(text("TRUNCATE question_import"))
+
+        QuestionService._copy_to_staging(session, [
+            [
+                row["notebook_id"], row["content"], row["type"], row["language"],
+                json.dumps(row["options"]), row["correct_answer"], row["explanation"], row["content_hash"],
+            ]
+            for row in rows
+        ])
+
+        staging = table("question_import", *[column(name) for name in QuestionService.IMPORT_COLUMNS])
+        statement = pg_insert(Question).from_select(
+            QuestionService.IMPORT_COLUMNS,
+            select(*[staging.c[name] for name in QuestionService.IMPORT_COLUMNS]),
+        )
+        statement = QuestionService._on_conflict(statement, on_duplicate)
+        # xmax is 0 on a freshly inserted row version and set on one rewritten by ON CONFLICT DO UPDATE
+        inserted = literal_column("xmax = 0")
+        return session.execute(statement.returning(Question.id, Question.content_hash, inserted)).all()
+
+    @staticmethod
+    def _copy_to_staging(session: Session, records: List[list]):
+        """COPY records (in IMPORT_COLUMNS order) into the question_import staging table with the session's driver."""
+        driver_connection = session.connection().connection.driver_connection
+        if session.get_bind().dialect.driver == "asyncpg":
+            # Reached through AsyncSession.run_sync: asyncpg's COPY is a coroutine, awaited on the session's greenlet
+            await_only(driver_connection.copy_records_to_table(
+                "question_import", records=records, columns=QuestionService.IMPORT_COLUMNS
+            ))
+            return
+
+        buffer = io.StringIO()
+        # Postgres reads an unquoted empty CSV field as NULL; quoted, "" stays an empty string
+        csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(records)
+        buffer.seek(0)
+        cursor = driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY question_import ({', '.join(QuestionService.IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def backfill_content_hashes(session: Session, chunk_size: int = 1000):
+        """Hash questions created before content hashes existed.
+
+        The oldest copy of each duplicate keeps the hash; later copies are left unhashed
+        (and so outside the unique index). Returns (hashed, duplicates).
+        """
+        seen = set(session.exec(
+            select(Question.notebook_id, Question.content_hash).where(Question.content_hash.is_not(None))
+        ).all())
+        hashed = duplicates = 0
+        last_id = 0
+        while True:
+            questions = session.exec(
+                select(Question)
+                .where(Question.content_hash.is_(None), Question.id > last_id)
+                .order_by(Question.id)
+                .limit(chunk_size)
+            ).all()
+            if not questions:
+                break
+            last_id = questions[-1].id
+
+            updates = []
+            for q in questions:
+                key = (q.notebook_id, QuestionService.content_hash(q))
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                updates.append({"id": q.id, "content_hash": key[1]})
+            if updates:
+                session.execute(update(Question), updates)
+                hashed += len(updates)
+            session.commit()
+        return hashed, duplicates
+
+    @staticmethod
+    def _study_query(notebook_id: int, mode: str):
+        """Questions under the notebook (including sub-notebooks) filtered by their latest status."""
+        ids_to_fetch = NotebookService.subtree_ids_query(notebook_id)
+
+        query = (
+            select(Question)
+            .outerjoin(QuestionStatus, QuestionStatus.question_id == Question.id)
+            .where(Question.notebook_id.in_(ids_to_fetch))
+        )
+        if mode == "incorrect":
+            query = query.where(QuestionStatus.last_is_correct == False)
+        elif mode == "unresolved":
+            query = query.where(QuestionStatus.question_id.is_(None))
+        return query
+
+    @staticmethod
+    def _keyset_page(session: Session, query, limit: Optional[int], after: Optional[int]) -> Tuple[List[Question], Optional[int]]:
+        """Rows with id > after in id order, at most limit of them, plus the cursor of the next page (None on the last one)."""
+        if after is not None:
+            query = query.where(Question.id > after)
+        query = query.order_by(Question.id)
+        if limit is None:
+            return list(session.exec(query).all()), None
+
+        rows = list(session.exec(query.limit(limit + 1)).all())
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, rows[-1].id
+        return rows, None
+
+    @staticmethod
+    def get_study_questions(
+        session: Session,
+        notebook_id: int,
+        mode: str,
+        randomize: bool,
+        limit: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Question], Optional[int]]:
+        """One keyset page of study questions and the next cursor. Randomizing shuffles within the page."""
+        filtered_questions, next_cursor = QuestionService._keyset_page(
+            session, QuestionService._study_query(notebook_id, mode), limit, after
+        )
+
         if randomize:
             random.shuffle(filtered_questions)
             
-        return filtered_questions
+        return filtered_questions, next_cursor
+
+    DENSE_SAMPLE_RATIO = 0.25
+    # Probing is abandoned for reading the ids when fewer ids in the range are eligible than this
+    MIN_PROBE_HIT_RATE = 0.05
+    SAMPLE_PROBE_ROUNDS = 4
+    MAX_PROBES_PER_ROUND = 5000
 
     @staticmethod
-    def get_by_notebook(session: Session, notebook_id: int) -> List[Question]:
-        """Get all questions directly in a notebook (no recursion)."""
+    def sample_question_ids(session: Session, notebook_id: int, mode: str, count: int) -> List[int]:
+        """Pick up to count random question ids from the study set, uniformly and in random order.
+
+        Sparse samples use rejection sampling: random ids are drawn from the question id range
+        and kept when they belong to the study set, checked a round at a time with one
+        primary-key IN lookup, so a 20-question drill on a huge notebook costs a few indexed
+        lookups. The set's size comes from the notebook counters. Dense samples, and study sets
+        too thin in the id range for probes to hit, read the eligible ids and sample in Python.
+        """
+        total = QuestionService.count_study_questions(session, notebook_id, mode)
+        if not total or count < 1:
+            return []
+        query = QuestionService._study_query(notebook_id, mode).with_only_columns(Question.id)
+
+        picked = {}
+        if count < total * QuestionService.DENSE_SAMPLE_RATIO:
+            # Separate statements, so SQLite answers each from the primary key instead of scanning
+            low = session.exec(select(func.min(Question.id))).one()
+            high = session.exec(select(func.max(Question.id))).one()
+            span = high - low + 1
+            hit_rate = total / span
+            for _ in range(QuestionService.SAMPLE_PROBE_ROUNDS if hit_rate >= QuestionService.MIN_PROBE_HIT_RATE else 0):
+                need = count - len(picked)
+                # Enough candidates to expect every missing id, with headroom
+                size = min(span, QuestionService.MAX_PROBES_PER_ROUND, math.ceil(need / hit_rate * 1.5) + 10)
+                candidates = random.sample(range(low, high + 1), size)
+                hits = set(session.exec(query.where(Question.id.in_(candidates))).all())
+                # Accepting hits in draw order, skipping ones already picked, keeps every eligible id equally likely
+                for candidate in candidates:
+                    if candidate in hits and candidate not in picked:
+                        picked[candidate] = None
+                        if len(picked) == count:
+                            return list(picked)
+
+        # Dense or unlucky: sample what is still missing from the eligible ids
+        remaining = [question_id for question_id in session.exec(query).all() if question_id not in picked]
+        picked.update((question_id, None) for question_id in random.sample(remaining, min(count - len(picked), len(remaining))))
+        ids = list(picked)
+        random.shuffle(ids)
+        return ids
+
+    @staticmethod
+    def get_sampled_questions(session: Session, notebook_id: int, mode: str, count: int) -> List[Question]:
+        ids = QuestionService.sample_question_ids(session, notebook_id, mode, count)
+        found = {q.id: q for q in session.exec(select(Question).where(Question.id.in_(ids))).all()}
+        return [found[question_id] for question_id in ids]
+
+    @staticmethod
+    def count_study_questions(session: Session, notebook_id: int, mode: str) -> int:
+        """Size of the study set, read from the notebook's subtree counters instead of counting rows."""
+        counts = session.exec(
+            select(NotebookCounter.total, NotebookCounter.attempted, NotebookCounter.correct)
+            .where(NotebookCounter.notebook_id == notebook_id)
+        ).first()
+        if counts is None:
+            return 0
+        total, attempted, correct = counts
+        if mode == "incorrect":
+            return attempted - correct
+        if mode == "unresolved":
+            return total - attempted
+        return total
+
+    @staticmethod
+    def get_by_notebook(
+        session: Session,
+        notebook_id: int,
+        limit: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Question], Optional[int]]:
+        """Get one keyset page of the questions directly in a notebook (no recursion)."""
         statement = select(Question).where(Question.notebook_id == notebook_id)
-        return session.exec(statement).all()
+        return QuestionService._keyset_page(session, statement, limit, after)
+
+    @staticmethod
+    def count_by_notebook(session: Session, notebook_id: int) -> int:
+        """Questions directly in the notebook: its subtree counter minus its children's."""
+        subtree = session.exec(
+            select(NotebookCounter.total).where(NotebookCounter.notebook_id == notebook_id)
+        ).first() or 0
+        children = session.exec(
+            select(func.coalesce(func.sum(NotebookCounter.total), 0))
+            .join(Notebook, Notebook.id == NotebookCounter.notebook_id)
+            .where(Notebook.parent_id == notebook_id)
+        ).one()
+        return subtree - children
 
     @staticmethod
     def delete_question(session: Session, question_id: int) -> bool:
@@ -74,33 +370,343 @@ class QuestionService:
         if not question:
             return False
         
-        # Attempts should be cascaded or manually deleted if cascade not set in model
-        # For safety/SQLModel quirks, let's delete attempts first
-        attempts = session.exec(select(Attempt).where(Attempt.question_id == question_id)).all()
-        for attempt in attempts:
-            session.delete(attempt)
+        status = session.get(QuestionStatus, question_id)
+        NotebookService.adjust_counters(
+            session,
+            question.notebook_id,
+            total=-1,
+            attempted=-1 if status else 0,
+            correct=-1 if status and status.last_is_correct else 0,
+        )
+
+        # Take the question's history out of the daily rollup, one UPDATE per day it was answered on
+        day = QuestionService._attempt_day(session)
+        per_day = session.execute(
+            select(day, func.count(Attempt.id), func.sum(cast(Attempt.is_correct, Integer)))
+            .where(Attempt.question_id == question_id)
+            .group_by(day)
+        ).all()
+        for attempt_day, attempts_count, correct_count in per_day:
+            if isinstance(attempt_day, str):
+                attempt_day = date.fromisoformat(attempt_day)
+            session.execute(
+                update(DailyActivity)
+                .where(DailyActivity.notebook_id == question.notebook_id, DailyActivity.day == attempt_day)
+                .values(
+                    attempts=DailyActivity.attempts - attempts_count,
+                    correct=DailyActivity.correct - correct_count,
+                )
+            )
+
+        session.execute(delete(Attempt).where(Attempt.question_id == question_id))
+        session.execute(delete(QuestionStatus).where(QuestionStatus.question_id == question_id))
             
-        session.delete(question)
+        notebook_id = question.notebook_id
+        session.execute(delete(Question).where(Question.id == question_id))
         session.commit()
+        answer_key_cache.discard(question_id)
+        NotebookService.invalidate_stats(session, notebook_id)
         return True
 
     @staticmethod
     def submit_attempt(session: Session, question_id: int, selected_option: str):
-        question = session.get(Question, question_id)
-        if not question:
+        key = QuestionService.get_answer_key(session, question_id)
+        if not key:
             return None
             
-        is_correct = (selected_option == question.correct_answer)
+        is_correct = (selected_option == key.correct_answer)
         
         db_attempt = Attempt(
             question_id=question_id,
             is_correct=is_correct
         )
         session.add(db_attempt)
+        QuestionService._update_status(session, question_id, key.notebook_id, is_correct, db_attempt.timestamp)
+        QuestionService._record_activity(session, key.notebook_id, db_attempt.timestamp.date(), 1, int(is_correct))
         session.commit()
+        NotebookService.invalidate_stats(session, key.notebook_id)
         
         return {
             "is_correct": is_correct,
-            "correct_answer": question.correct_answer,
-            "explanation": question.explanation
+            "correct_answer": key.correct_answer,
+            "explanation": key.explanation
         }
+
+    @staticmethod
+    def get_answer_key(session: Session, question_id: int) -> Optional[AnswerKey]:
+        """A question's answer key, read through answer_key_cache; None if the question doesn't exist."""
+        return answer_key_cache.get(question_id) or QuestionService._load_answer_key(session, question_id)
+
+    @staticmethod
+    def _load_answer_key(session: Session, question_id: int) -> Optional[AnswerKey]:
+        row = session.execute(
+            select(Question.correct_answer, Question.explanation, Question.notebook_id).where(Question.id == question_id)
+        ).first()
+        if row is None:
+            return None
+        key = AnswerKey(*row)
+        answer_key_cache.put(question_id, key)
+        return key
+
+    @staticmethod
+    def warm_answer_keys(questions: Iterable[Question]):
+        """Cache the answer keys of questions just loaded, e.g. those about to be studied."""
+        for question in questions:
+            answer_key_cache.put(question.id, AnswerKey(question.correct_answer, question.explanation, question.notebook_id))
+
+    @staticmethod
+    def submit_attempts(session: Session, items: List[AttemptBatchItem]) -> List[Optional[dict]]:
+        """Grade and record many attempts in one transaction; returns one result per item, in order.
+
+        Questions are loaded with a single IN query and attempts inserted with one executemany.
+        Items for unknown questions get None and are not recorded. answered_at defaults to now;
+        naive values are taken as UTC and future ones are clamped to now.
+        """
+        now = utc_now()
+        question_ids = {item.question_id for item in items}
+        questions = {q.id: q for q in session.exec(select(Question).where(Question.id.in_(question_ids))).all()}
+
+        results, attempts = [], []
+        for item in items:
+            question = questions.get(item.question_id)
+            if not question:
+                results.append(None)
+                continue
+            is_correct = item.selected_option == question.correct_answer
+            timestamp = now
+            if item.answered_at is not None:
+                # Naive values are already UTC; aware ones are converted and stored naive like every timestamp
+                timestamp = min(QuestionService._utc_naive(item.answered_at), now)
+            attempts.append({"question_id": question.id, "is_correct": is_correct, "timestamp": timestamp})
+            results.append({
+                "is_correct": is_correct,
+                "correct_answer": question.correct_answer,
+                "explanation": question.explanation
+            })
+        if not attempts:
+            return results
+
+        session.execute(insert(Attempt), attempts)
+        # One status upsert per question, carrying its latest attempt and its totals
+        latest, totals, activity = {}, {}, {}
+        for attempt in sorted(attempts, key=lambda a: a["timestamp"]):
+            question_id = attempt["question_id"]
+            latest[question_id] = attempt
+            attempts_count, correct_count = totals.get(question_id, (0, 0))
+            totals[question_id] = (attempts_count + 1, correct_count + int(attempt["is_correct"]))
+            key = (questions[question_id].notebook_id, attempt["timestamp"].date())
+            attempts_count, correct_count = activity.get(key, (0, 0))
+            activity[key] = (attempts_count + 1, correct_count + int(attempt["is_correct"]))
+        for question_id, attempt in latest.items():
+            attempts_count, correct_count = totals[question_id]
+            QuestionService._update_status(
+                session, question_id, questions[question_id].notebook_id, attempt["is_correct"], attempt["timestamp"],
+                attempts=attempts_count, correct=correct_count
+            )
+        for (notebook_id, day), (attempts_count, correct_count) in activity.items():
+            QuestionService._record_activity(session, notebook_id, day, attempts_count, correct_count)
+        session.commit()
+
+        for notebook_id in {notebook_id for notebook_id, _ in activity}:
+            NotebookService.invalidate_stats(session, notebook_id)
+        return results
+
+    @staticmethod
+    def _update_status(
+        session: Session,
+        question_id: int,
+        notebook_id: int,
+        is_correct: bool,
+        timestamp,
+        attempts: int = 1,
+        correct: Optional[int] = None
+    ):
+        """Fold new attempts into the question's status row and the notebook counters (caller commits).
+
+        is_correct and timestamp describe the latest of the attempts; attempts and correct count
+        them all (one attempt by default). An upsert adds the counts in SQL and returns the latest
+        attempt recorded before, so concurrent first answers neither collide on the primary key
+        nor lose increments. Attempts older than the recorded latest one (e.g. replayed from a
+        client buffer) only add to the totals.
+        """
+        if correct is None:
+            correct = int(is_correct)
+        timestamp = QuestionService._utc_naive(timestamp)
+        statement = QuestionService._dialect_insert(session, QuestionStatus).values(
+            question_id=question_id,
+            last_is_correct=is_correct,
+            last_attempt_at=timestamp,
+            attempt_count=attempts,
+            correct_count=correct,
+        )
+        # The existing row is locked from here until commit, so the previous latest attempt stays current
+        attempt_count, last_is_correct, last_attempt_at = session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["question_id"],
+                set_={
+                    "attempt_count": QuestionStatus.attempt_count + statement.excluded.attempt_count,
+                    "correct_count": QuestionStatus.correct_count + statement.excluded.correct_count,
+                },
+            ).returning(QuestionStatus.attempt_count, QuestionStatus.last_is_correct, QuestionStatus.last_attempt_at)
+        ).one()
+
+        if attempt_count == attempts:
+            # The row was just inserted with this latest attempt
+            NotebookService.adjust_counters(session, notebook_id, attempted=1, correct=int(is_correct))
+        elif timestamp >= QuestionService._utc_naive(last_attempt_at):
+            if last_is_correct != is_correct:
+                NotebookService.adjust_counters(session, notebook_id, correct=1 if is_correct else -1)
+            session.execute(
+                update(QuestionStatus)
+                .where(QuestionStatus.question_id == question_id)
+                .values(last_is_correct=is_correct, last_attempt_at=timestamp)
+            )
+
+    @staticmethod
+    def _utc_naive(timestamp: datetime) -> datetime:
+        """Timestamps are stored and read back as naive UTC; convert aware ones to match."""
+        if timestamp.tzinfo is None:
+            return timestamp
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+    @staticmethod
+    def _dialect_insert(session: Session, model):
+        """INSERT construct with ON CONFLICT support for the session's database."""
+        if session.get_bind().dialect.name == "postgresql":
+            return pg_insert(model)
+        return sqlite_insert(model)
+
+    @staticmethod
+    def _record_activity(session: Session, notebook_id: int, day, attempts: int, correct: int):
+        """Add attempts to the (notebook, day) rollup with an atomic upsert (caller commits)."""
+        statement = QuestionService._dialect_insert(session, DailyActivity).values(
+            notebook_id=notebook_id, day=day, attempts=attempts, correct=correct
+        )
+        session.execute(statement.on_conflict_do_update(
+            index_elements=["notebook_id", "day"],
+            set_={
+                "attempts": DailyActivity.attempts + statement.excluded.attempts,
+                "correct": DailyActivity.correct + statement.excluded.correct,
+            },
+        ))
+
+    @staticmethod
+    def _attempt_day(session: Session):
+        """SQL expression for the UTC day of Attempt.timestamp (SQLite returns it as an ISO string)."""
+        if session.get_bind().dialect.name == "postgresql":
+            return cast(Attempt.timestamp, Date)
+        return func.date(Attempt.timestamp)
+
+    @staticmethod
+    def rebuild_daily_activity(session: Session) -> int:
+        """Recompute the DailyActivity rollup from the raw Attempt history."""
+        day = QuestionService._attempt_day(session)
+        per_day = (
+            select(
+                Question.notebook_id,
+                day,
+                func.count(Attempt.id),
+                func.sum(cast(Attempt.is_correct, Integer)),
+            )
+            .select_from(Attempt)
+            .join(Question, Question.id == Attempt.question_id)
+            .group_by(Question.notebook_id, day)
+        )
+        session.execute(delete(DailyActivity))
+        session.execute(insert(DailyActivity).from_select(["notebook_id", "day", "attempts", "correct"], per_day))
+        session.commit()
+        return session.exec(select(func.count()).select_from(DailyActivity)).one()
+
+    @staticmethod
+    def rebuild_statuses(session: Session) -> int:
+        """Recompute every QuestionStatus row from the raw Attempt history."""
+        ranked = select(
+            Attempt.question_id,
+            Attempt.is_correct,
+            Attempt.timestamp,
+            func.row_number().over(
+                partition_by=Attempt.question_id,
+                order_by=(Attempt.timestamp.desc(), Attempt.id.desc())
+            ).label("rn"),
+            func.count().over(partition_by=Attempt.question_id).label("attempt_count"),
+            func.sum(cast(Attempt.is_correct, Integer)).over(partition_by=Attempt.question_id).label("correct_count"),
+        ).subquery()
+
+        latest = select(
+            ranked.c.question_id,
+            ranked.c.is_correct,
+            ranked.c.timestamp,
+            ranked.c.attempt_count,
+            ranked.c.correct_count,
+        ).where(ranked.c.rn == 1)
+
+        session.execute(delete(QuestionStatus))
+        session.execute(
+            insert(QuestionStatus).from_select(
+                ["question_id", "last_is_correct", "last_attempt_at", "attempt_count", "correct_count"],
+                latest,
+            )
+        )
+        session.commit()
+        NotebookService.rebuild_counters(session)
+        return session.exec(select(func.count()).select_from(QuestionStatus)).one()
+
+class AsyncQuestionService:
+    """Async twin of QuestionService, running each call through AsyncSession.run_sync."""
+    @staticmethod
+    async def bulk_insert_questions(
+        session: AsyncSession,
+        notebook_id: int,
+        items: List[QuestionImportItem],
+        on_duplicate: str = "skip"
+    ) -> List[int]:
+        return await session.run_sync(QuestionService.bulk_insert_questions, notebook_id, items, on_duplicate)
+
+    @staticmethod
+    async def get_study_questions(
+        session: AsyncSession,
+        notebook_id: int,
+        mode: str,
+        randomize: bool,
+        limit: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Question], Optional[int]]:
+        return await session.run_sync(QuestionService.get_study_questions, notebook_id, mode, randomize, limit, after)
+
+    @staticmethod
+    async def count_study_questions(session: AsyncSession, notebook_id: int, mode: str) -> int:
+        return await session.run_sync(QuestionService.count_study_questions, notebook_id, mode)
+
+    @staticmethod
+    async def get_sampled_questions(session: AsyncSession, notebook_id: int, mode: str, count: int) -> List[Question]:
+        return await session.run_sync(QuestionService.get_sampled_questions, notebook_id, mode, count)
+
+    @staticmethod
+    async def get_by_notebook(
+        session: AsyncSession,
+        notebook_id: int,
+        limit: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Tuple[List[Question], Optional[int]]:
+        return await session.run_sync(QuestionService.get_by_notebook, notebook_id, limit, after)
+
+    @staticmethod
+    async def count_by_notebook(session: AsyncSession, notebook_id: int) -> int:
+        return await session.run_sync(QuestionService.count_by_notebook, notebook_id)
+
+    @staticmethod
+    async def delete_question(session: AsyncSession, question_id: int) -> bool:
+        return await session.run_sync(QuestionService.delete_question, question_id)
+
+    @staticmethod
+    async def get_answer_key(session: AsyncSession, question_id: int) -> Optional[AnswerKey]:
+        # Cache hits skip the hop onto the database connection entirely
+        return answer_key_cache.get(question_id) or await session.run_sync(QuestionService._load_answer_key, question_id)
+
+    @staticmethod
+    async def submit_attempts(session: AsyncSession, items: List[AttemptBatchItem]) -> List[Optional[dict]]:
+        return await session.run_sync(QuestionService.submit_attempts, items)
+
+    @staticmethod
+    async def submit_attempt(session: AsyncSession, question_id: int, selected_option: str):
+        return await session.run_sync(QuestionService.submit_attempt, question_id, selected_option)
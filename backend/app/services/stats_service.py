@@ -1,112 +1,108 @@
-from sqlmodel import Session, select
-from app.models import Notebook, Question, Attempt
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import and_, case
+from typing import Dict, List, Optional, Tuple
+from app.core.cache import stats_cache
+from app.models import DailyActivity, Notebook, NotebookClosure, NotebookCounter, Question, QuestionStatus
 from app.schemas import Stats
+from app.services.notebook_service import NotebookService
 
 class StatsService:
+    @staticmethod
+    def _status_counts(session: Session, *conditions):
+        """Return (total, attempted, correct) for the questions matching conditions in one query."""
+        query = (
+            select(
+                func.count(Question.id),
+                func.count(QuestionStatus.question_id),
+                func.coalesce(func.sum(case((QuestionStatus.last_is_correct == True, 1), else_=0)), 0),
+            )
+            .select_from(Question)
+            .outerjoin(QuestionStatus, QuestionStatus.question_id == Question.id)
+        )
+        for condition in conditions:
+            query = query.where(condition)
+        total, attempted, correct = session.exec(query).one()
+        return total, attempted, correct
+
+    @staticmethod
+    def _window_starts(now: datetime):
+        """Start of the current day, week (Monday) and month."""
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=now.weekday())
+        month_start = today_start.replace(day=1)
+        return today_start, week_start, month_start
+
+    @staticmethod
+    def _attempts_since(start: datetime):
+        """SUM of DailyActivity attempts on or after start's day."""
+        return func.coalesce(func.sum(case((DailyActivity.day >= start.date(), DailyActivity.attempts), else_=0)), 0)
+
+    @staticmethod
+    def _activity_counts(session: Session, *conditions):
+        """Sum the DailyActivity rollup per time window and per root notebook in one query.
+
+        Returns (today, week, month, category_stats) where category_stats maps each
+        root notebook name to the number of attempts made anywhere in its tree.
+        """
+        today_start, week_start, month_start = StatsService._window_starts(datetime.now(timezone.utc))
+
+        # Each notebook has exactly one root ancestor in the closure table: its category
+        query = (
+            select(
+                Notebook.name,
+                func.sum(DailyActivity.attempts),
+                StatsService._attempts_since(today_start),
+                StatsService._attempts_since(week_start),
+                StatsService._attempts_since(month_start),
+            )
+            .select_from(DailyActivity)
+            .join(NotebookClosure, NotebookClosure.descendant_id == DailyActivity.notebook_id)
+            .join(Notebook, and_(Notebook.id == NotebookClosure.ancestor_id, Notebook.parent_id.is_(None)))
+            .group_by(Notebook.id, Notebook.name)
+        )
+        for condition in conditions:
+            query = query.where(condition)
+
+        questions_today = questions_week = questions_month = 0
+        category_stats = {}
+        for name, attempts, today, week, month in session.exec(query).all():
+            questions_today += today
+            questions_week += week
+            questions_month += month
+            category_stats[name] = category_stats.get(name, 0) + attempts
+        return questions_today, questions_week, questions_month, category_stats
+
     @staticmethod
     def get_stats(session: Session, notebook_id: int) -> Stats:
-        all_notebooks = session.exec(select(Notebook)).all()
-        ids_to_fetch = {notebook_id}
-        queue = [notebook_id]
-        while queue:
-            current = queue.pop(0)
-            children = [n.id for n in all_notebooks if n.parent_id == current]
-            ids_to_fetch.update(children)
-            queue.extend(children)
-            
-        questions = session.exec(select(Question).where(Question.notebook_id.in_(ids_to_fetch))).all()
-        
-        total = len(questions)
-        attempted_count = 0
-        correct_count = 0
-        incorrect_count = 0
-        
-        for q in questions:
-            latest = session.exec(
-                select(Attempt).where(Attempt.question_id == q.id).order_by(Attempt.timestamp.desc())
-            ).first()
-            
-            if latest:
-                attempted_count += 1
-                if latest.is_correct:
-                    correct_count += 1
-                else:
-                    incorrect_count += 1
+        counter = session.get(NotebookCounter, notebook_id) or NotebookCounter(notebook_id=notebook_id)
+        questions_today, questions_week, questions_month, _ = StatsService._activity_counts(
+            session, DailyActivity.notebook_id.in_(NotebookService.subtree_ids_query(notebook_id))
+        )
                     
-        accuracy = (correct_count / attempted_count) if attempted_count > 0 else 0.0
+        accuracy = (counter.correct / counter.attempted) if counter.attempted > 0 else 0.0
         
         return Stats(
-            total_questions=total,
-            attempted=attempted_count,
-            correct=correct_count,
-            incorrect=incorrect_count,
+            total_questions=counter.total,
+            attempted=counter.attempted,
+            correct=counter.correct,
+            incorrect=counter.attempted - counter.correct,
             accuracy=accuracy,
-            questions_today=0, # Not implemented for specific notebook yet, or not requested
-            questions_week=0,
-            questions_month=0,
-            category_stats={} 
+            questions_today=questions_today,
+            questions_week=questions_week,
+            questions_month=questions_month,
+            category_stats={}
         )
 
     @staticmethod
     def get_global_stats(session: Session) -> Stats:
-        questions = session.exec(select(Question)).all()
-        
-        total = len(questions)
-        attempted_count = 0
-        correct_count = 0
-        incorrect_count = 0
-        
-        for q in questions:
-            latest = session.exec(
-                select(Attempt).where(Attempt.question_id == q.id).order_by(Attempt.timestamp.desc())
-            ).first()
-            
-            if latest:
-                attempted_count += 1
-                if latest.is_correct:
-                    correct_count += 1
-                else:
-                    incorrect_count += 1
+        total, attempted_count, correct_count = StatsService._status_counts(session)
+        incorrect_count = attempted_count - correct_count
                     
         accuracy = (correct_count / attempted_count) if attempted_count > 0 else 0.0
         
-        # Time-based metrics
-        from datetime import datetime, timedelta, timezone
-        now = datetime.now(timezone.utc)
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=now.weekday()) # Monday
-        month_start = today_start.replace(day=1)
-
-        questions_today = 0
-        questions_week = 0
-        questions_month = 0
-        category_stats = {}
-
-        # Fetch all attempts for time calculations and category breakdown
-        # Optimized: Fetching all might be heavy for large DBs, but fine for now.
-        # Ideally should use aggregation queries, but keeping python logic for simplicity as requested.
-        all_attempts = session.exec(select(Attempt).join(Question).join(Notebook)).all() # Join for category
-
-        for att in all_attempts:
-            # Check time
-            if att.timestamp >= today_start:
-                questions_today += 1
-            if att.timestamp >= week_start:
-                questions_week += 1
-            if att.timestamp >= month_start:
-                questions_month += 1
-            
-            # Category Breakdown (only correct answers? or all? Let's do all attempts for activity)
-            # Request says "based on each category", usually means performance or activity.
-            # Let's track activity (count) for now, or correctness? 
-            # "Adicionar número de questões feitas... e com base em cada categoria"
-            # It implies "number of questions done" per category.
-            
-            # We need the root notebook name as category, or immediate parent?
-            # Let's use the immediate notebook name for now.
-            if att.question and att.question.notebook:
-                cat_name = att.question.notebook.name
-                category_stats[cat_name] = category_stats.get(cat_name, 0) + 1
+        questions_today, questions_week, questions_month, category_stats = StatsService._activity_counts(session)
 
         return Stats(
             total_questions=total,
@@ -119,3 +115,83 @@ class StatsService:
             questions_month=questions_month,
             category_stats=category_stats
         )
+
+    @staticmethod
+    def get_tree_stats(session: Session, notebook_ids: Optional[List[int]] = None) -> Dict[int, Stats]:
+        """Stats for every notebook (or just notebook_ids), keyed by id, in two grouped queries.
+
+        Counts come from the stored NotebookCounter rows; the time windows sum the daily rollup
+        of each notebook's subtree, grouped by ancestor through the closure table.
+        """
+        today_start, week_start, month_start = StatsService._window_starts(datetime.now(timezone.utc))
+
+        counters = select(NotebookCounter)
+        windows = (
+            select(
+                NotebookClosure.ancestor_id,
+                StatsService._attempts_since(today_start),
+                StatsService._attempts_since(week_start),
+                StatsService._attempts_since(month_start),
+            )
+            .select_from(DailyActivity)
+            .join(NotebookClosure, NotebookClosure.descendant_id == DailyActivity.notebook_id)
+            .group_by(NotebookClosure.ancestor_id)
+        )
+        if notebook_ids is not None:
+            counters = counters.where(NotebookCounter.notebook_id.in_(notebook_ids))
+            windows = windows.where(NotebookClosure.ancestor_id.in_(notebook_ids))
+
+        activity = {notebook_id: (today, week, month) for notebook_id, today, week, month in session.execute(windows).all()}
+        tree_stats = {}
+        for counter in session.exec(counters).all():
+            questions_today, questions_week, questions_month = activity.get(counter.notebook_id, (0, 0, 0))
+            tree_stats[counter.notebook_id] = Stats(
+                total_questions=counter.total,
+                attempted=counter.attempted,
+                correct=counter.correct,
+                incorrect=counter.attempted - counter.correct,
+                accuracy=(counter.correct / counter.attempted) if counter.attempted > 0 else 0.0,
+                questions_today=questions_today,
+                questions_week=questions_week,
+                questions_month=questions_month,
+                category_stats={}
+            )
+        return tree_stats
+
+class AsyncStatsService:
+    """Async twin of StatsService, running each call through AsyncSession.run_sync.
+
+    Results are served from stats_cache while no write has touched the notebook, and are
+    returned together with their ETag.
+    """
+    @staticmethod
+    async def get_stats(session: AsyncSession, notebook_id: int) -> Tuple[Stats, str]:
+        key = stats_cache.key(notebook_id)
+        cached = stats_cache.get(key)
+        if cached:
+            return cached
+        stats = await session.run_sync(StatsService.get_stats, notebook_id)
+        return stats, stats_cache.put(key, stats)
+
+    @staticmethod
+    async def get_global_stats(session: AsyncSession) -> Tuple[Stats, str]:
+        key = stats_cache.key(None)
+        cached = stats_cache.get(key)
+        if cached:
+            return cached
+        stats = await session.run_sync(StatsService.get_global_stats)
+        return stats, stats_cache.put(key, stats)
+
+    @staticmethod
+    async def get_tree_stats(session: AsyncSession) -> Tuple[Dict[int, Stats], str]:
+        # Any write changes some notebook's stats, so the tree follows the global generation
+        key = stats_cache.key(None, "tree")
+        cached = stats_cache.get(key)
+        if cached:
+            return cached
+        tree_stats = await session.run_sync(StatsService.get_tree_stats)
+        return tree_stats, stats_cache.put(key, tree_stats)
+
+    @staticmethod
+    async def get_batch_stats(session: AsyncSession, notebook_ids: List[int]) -> Dict[int, Stats]:
+        return await session.run_sync(StatsService.get_tree_stats, notebook_ids)
@@ -0,0 +1,87 @@
+import random
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import Question, StudySession
+from app.schemas import StudySessionCreate, StudySessionItem, StudySessionRead
+from app.services.question_service import QuestionService
+from typing import List, Optional
+
+class StudyService:
+    @staticmethod
+    def create(session: Session, data: StudySessionCreate) -> StudySession:
+        """Snapshot the filtered question ids; a seeded shuffle fixes the order when randomizing.
+
+        With count, a random sample of that size is drawn in the database instead.
+        """
+        seed = None
+        if data.count is not None:
+            question_ids = QuestionService.sample_question_ids(session, data.notebook_id, data.mode, data.count)
+        else:
+            query = QuestionService._study_query(data.notebook_id, data.mode).with_only_columns(Question.id).order_by(Question.id)
+            question_ids = list(session.exec(query).all())
+
+        if data.randomize and data.count is None:
+            seed = data.seed if data.seed is not None else random.SystemRandom().randrange(2**31)
+            random.Random(seed).shuffle(question_ids)
+
+        study = StudySession(notebook_id=data.notebook_id, mode=data.mode, seed=seed, question_ids=question_ids)
+        session.add(study)
+        session.commit()
+        session.refresh(study)
+        return study
+
+    @staticmethod
+    def get_by_id(session: Session, study_id: str) -> Optional[StudySession]:
+        return session.get(StudySession, study_id)
+
+    @staticmethod
+    def to_read(study: StudySession) -> StudySessionRead:
+        return StudySessionRead(
+            id=study.id,
+            notebook_id=study.notebook_id,
+            mode=study.mode,
+            seed=study.seed,
+            total=len(study.question_ids),
+            position=study.position,
+        )
+
+    @staticmethod
+    def get_questions(session: Session, study: StudySession, offset: int, limit: int) -> List[StudySessionItem]:
+        """The questions at positions [offset, offset + limit); questions deleted since are skipped."""
+        window = study.question_ids[offset:offset + limit]
+        if not window:
+            return []
+        found = {q.id: q for q in session.exec(select(Question).where(Question.id.in_(window))).all()}
+        # These are about to be answered: let grading skip the question lookup
+        QuestionService.warm_answer_keys(found.values())
+        return [
+            StudySessionItem(position=offset + i, question=found[question_id])
+            for i, question_id in enumerate(window)
+            if question_id in found
+        ]
+
+    @staticmethod
+    def set_position(session: Session, study: StudySession, position: int) -> StudySession:
+        study.position = min(position, len(study.question_ids))
+        session.add(study)
+        session.commit()
+        session.refresh(study)
+        return study
+
+class AsyncStudyService:
+    """Async twin of StudyService, running each call through AsyncSession.run_sync."""
+    @staticmethod
+    async def create(session: AsyncSession, data: StudySessionCreate) -> StudySession:
+        return await session.run_sync(StudyService.create, data)
+
+    @staticmethod
+    async def get_by_id(session: AsyncSession, study_id: str) -> Optional[StudySession]:
+        return await session.get(StudySession, study_id)
+
+    @staticmethod
+    async def get_questions(session: AsyncSession, study: StudySession, offset: int, limit: int) -> List[StudySessionItem]:
+        return await session.run_sync(StudyService.get_questions, study, offset, limit)
+
+    @staticmethod
+    async def set_position(session: AsyncSession, study: StudySession, position: int) -> StudySession:
+        return await session.run_sync(StudyService.set_position, study, position)
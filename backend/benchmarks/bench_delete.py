@@ -0,0 +1,122 @@
+"""Time deleting a large notebook subtree with its questions and attempts.
+
+Usage (from the backend directory):
+    python benchmarks/bench_delete.py [questions] [attempts_per_question]
+
+Defaults to 50,000 questions with 10 attempts each (500,000 attempts) spread over a root
+notebook and 10 sub-notebooks. The set-based NotebookService.delete is timed on the whole
+tree; the original per-question path (load each question's attempts and delete them one
+ORM object at a time) is timed on a sample and extrapolated.
+
+Runs against DATABASE_URL when set, otherwise against a temporary SQLite file.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, func, select
+from app.core.database import engine
+from app.models import Attempt, Question, QuestionStatus, utc_now
+from app.schemas import NotebookCreate, QuestionImportItem
+from app.services.notebook_service import NotebookService
+from app.services.question_service import QuestionService
+
+SUB_NOTEBOOKS = 10
+LEGACY_SAMPLE = 500
+INSERT_CHUNK = 50_000
+
+def seed(session, questions, attempts_per_question):
+    root = NotebookService.create(session, NotebookCreate(name="bench-delete"))
+    notebook_ids = [root.id] + [
+        NotebookService.create(session, NotebookCreate(name=f"bench-delete-{i}", parent_id=root.id)).id
+        for i in range(SUB_NOTEBOOKS)
+    ]
+    per_notebook = questions // len(notebook_ids)
+    question_ids = []
+    for n, notebook_id in enumerate(notebook_ids):
+        items = [
+            QuestionImportItem(
+                content=f"Notebook {n} question #{i}?",
+                type="true_false",
+                language="en",
+                options=["True", "False"],
+                correct_answer="True",
+                explanation="Generated for benchmarking.",
+            )
+            for i in range(per_notebook)
+        ]
+        question_ids += QuestionService.bulk_insert_questions(session, notebook_id, items)
+
+    start = utc_now() - timedelta(days=60)
+    rows = (
+        {"question_id": question_id, "is_correct": k % 3 != 0, "timestamp": start + timedelta(minutes=k * 97 + i % 1440)}
+        for i, question_id in enumerate(question_ids)
+        for k in range(attempts_per_question)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == INSERT_CHUNK:
+            session.execute(insert(Attempt), chunk)
+            chunk = []
+    if chunk:
+        session.execute(insert(Attempt), chunk)
+    session.commit()
+
+    QuestionService.rebuild_statuses(session)
+    QuestionService.rebuild_daily_activity(session)
+    return root.id, question_ids
+
+def legacy_delete_question(session, question_id):
+    """The original delete_question: every attempt loaded and deleted as an ORM object."""
+    question = session.get(Question, question_id)
+    for attempt in session.exec(select(Attempt).where(Attempt.question_id == question_id)).all():
+        session.delete(attempt)
+    status = session.get(QuestionStatus, question_id)
+    if status:
+        session.delete(status)
+    session.delete(question)
+    session.commit()
+
+def count(session, model):
+    return session.exec(select(func.count()).select_from(model)).one()
+
+def main():
+    questions = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    attempts_per_question = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    SQLModel.metadata.create_all(engine)
+
+    print(f"backend: {engine.dialect.name}")
+    with Session(engine) as session:
+        started = time.perf_counter()
+        root_id, question_ids = seed(session, questions, attempts_per_question)
+        print(
+            f"seeded {count(session, Question)} questions and {count(session, Attempt)} attempts "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        sample = question_ids[:LEGACY_SAMPLE]
+        started = time.perf_counter()
+        for question_id in sample:
+            legacy_delete_question(session, question_id)
+        legacy = (time.perf_counter() - started) / len(sample) * len(question_ids)
+        # Put the sample's counters back in line before the timed delete
+        NotebookService.rebuild_counters(session)
+
+        started = time.perf_counter()
+        NotebookService.delete(session, root_id)
+        set_based = time.perf_counter() - started
+        print(f"per-question ORM delete (extrapolated from {len(sample)}): {legacy:8.1f}s")
+        print(f"set-based subtree delete:                       {set_based:8.1f}s  ({legacy / set_based:.0f}x)")
+        print(f"left behind: {count(session, Question)} questions, {count(session, Attempt)} attempts")
+
+if __name__ == "__main__":
+    main()
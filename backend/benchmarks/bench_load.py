@@ -0,0 +1,141 @@
+"""Requests/sec of the async route handlers versus equivalent sync (threadpool) handlers.
+
+Usage (from the backend directory):
+    python benchmarks/bench_load.py [--concurrency 50] [--duration 10] [--questions 2000]
+
+Seeds a notebook, then serves the real app (async engine) and a sync twin of the hot
+endpoints defined below, each in its own uvicorn process, and drives both with the same
+mix of GET /stats/{id}, GET /study/{id}?limit=20 and POST /attempt/. Runs against
+DATABASE_URL when set (use the docker Postgres for meaningful numbers), otherwise a
+temporary SQLite file. Pool sizes come from DB_POOL_SIZE / DB_MAX_OVERFLOW.
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlmodel import Session
+from typing import List
+from app.core.database import engine, get_session, init_db
+from app.models import Question
+from app.schemas import AttemptCreate, AttemptResponse, NotebookCreate, QuestionImportItem, Stats
+from app.services.notebook_service import NotebookService
+from app.services.question_service import QuestionService
+from app.services.stats_service import StatsService
+
+# Sync twin of the hot endpoints: plain `def` handlers run in Starlette's threadpool
+sync_app = FastAPI(title="Question Solver API (sync handlers)")
+
+@sync_app.get("/")
+def sync_root():
+    return {"message": "ok"}
+
+@sync_app.get("/stats/{notebook_id}", response_model=Stats)
+def sync_stats(notebook_id: int, session: Session = Depends(get_session)):
+    return StatsService.get_stats(session, notebook_id)
+
+@sync_app.get("/study/{notebook_id}", response_model=List[Question])
+def sync_study(notebook_id: int, limit: int = 20, session: Session = Depends(get_session)):
+    return QuestionService.get_study_questions(session, notebook_id, "all", False, limit)[0]
+
+@sync_app.post("/attempt/", response_model=AttemptResponse)
+def sync_attempt(attempt: AttemptCreate, session: Session = Depends(get_session)):
+    return QuestionService.submit_attempt(session, attempt.question_id, attempt.selected_option)
+
+def seed(question_count):
+    init_db()
+    with Session(engine) as session:
+        notebook = NotebookService.create(session, NotebookCreate(name=f"bench-load-{time.time()}"))
+        items = [
+            QuestionImportItem(
+                content=f"Load question #{i}?",
+                type="true_false",
+                language="en",
+                options=["True", "False"],
+                correct_answer="True",
+                explanation="Generated for benchmarking.",
+            )
+            for i in range(question_count)
+        ]
+        ids = QuestionService.bulk_insert_questions(session, notebook.id, items)
+        return notebook.id, ids
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(app_path, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{app_path} did not start")
+
+async def drive(base_url, notebook_id, question_ids, concurrency, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        while time.perf_counter() < deadline:
+            roll = random.random()
+            start = time.perf_counter()
+            if roll < 0.4:
+                await client.get(f"/stats/{notebook_id}")
+            elif roll < 0.7:
+                await client.get(f"/study/{notebook_id}", params={"limit": 20})
+            else:
+                payload = {"question_id": random.choice(question_ids), "selected_option": random.choice(["True", "False"])}
+                await client.post("/attempt/", json=payload)
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    latencies.sort()
+    return len(latencies) / duration, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--questions", type=int, default=2000)
+    args = parser.parse_args()
+
+    notebook_id, question_ids = seed(args.questions)
+    print(f"backend: {engine.dialect.name}, concurrency {args.concurrency}, {args.duration:.0f}s per run")
+    print(f"{'handlers':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, app_path in [("sync", "benchmarks.bench_load:sync_app"), ("async", "main:app")]:
+        port = free_port()
+        server = start_server(app_path, port)
+        try:
+            rps, p50, p99 = asyncio.run(drive(f"http://127.0.0.1:{port}", notebook_id, question_ids, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{label:>8} {rps:>8.0f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Time splitting synthetic PDFs with different numbers of worker processes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pdf_split.py [chunk_size] [page_count ...]
+
+Defaults to 10-page chunks of 100, 500 and 2,000-page PDFs. Every page carries its own
+content stream and font so chunk writing does real work. Each PDF is split with 1 worker
+(in process) and then with 2, 4, ... up to os.cpu_count() worker processes; the speedup is
+relative to the single-worker run.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from app.services.pdf_service import PdfService
+
+LINES_PER_PAGE = 60
+
+def make_pdf(path: str, pages: int):
+    writer = PdfWriter()
+    for n in range(pages):
+        page = writer.add_blank_page(width=612, height=792)
+        text = "".join(
+            f"BT /F1 10 Tf 40 {760 - 12 * i} Td (Page {n + 1} line {i + 1}: synthetic benchmark text) Tj ET\n"
+            for i in range(LINES_PER_PAGE)
+        )
+        content = DecodedStreamObject()
+        content.set_data(text.encode())
+        font = DictionaryObject({
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        })
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): writer._add_object(font)})
+        })
+    writer.write(path)
+
+def worker_counts():
+    cpus = os.cpu_count() or 1
+    counts, n = [1], 2
+    while n < cpus:
+        counts.append(n)
+        n *= 2
+    if cpus > 1:
+        counts.append(cpus)
+    return counts
+
+def main():
+    chunk_size = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    page_counts = [int(arg) for arg in sys.argv[2:]] or [100, 500, 2000]
+    print(f"cpus: {os.cpu_count()}, chunk size: {chunk_size}")
+
+    workdir = tempfile.mkdtemp()
+    try:
+        for pages in page_counts:
+            source_path = os.path.join(workdir, f"source-{pages}.pdf")
+            make_pdf(source_path, pages)
+            print(f"\n{pages} pages ({os.path.getsize(source_path) / 1e6:.1f} MB)")
+            baseline = None
+            for workers in worker_counts():
+                zip_path = os.path.join(workdir, f"split-{pages}-{workers}.zip")
+                if workers > 1:
+                    # Start the pool's processes outside the timed run
+                    PdfService._pool(workers)
+                started = time.perf_counter()
+                PdfService.split_pdf(source_path, chunk_size, zip_path, workers=workers)
+                elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                print(f"  {workers:3d} worker(s): {elapsed:7.2f}s  ({baseline / elapsed:.1f}x)")
+                os.remove(zip_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare the per-object ORM upload path with the bulk insert fast path.
+
+Usage (from the backend directory):
+    python benchmarks/bench_upload.py [sizes...]
+
+Runs against DATABASE_URL when set (e.g. the docker Postgres, which exercises COPY),
+otherwise against a temporary SQLite file.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp_dir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+from sqlmodel import Session, SQLModel, delete
+from app.core.database import engine
+from app.models import Notebook, Question
+from app.schemas import QuestionImportItem
+from app.services.question_service import QuestionService
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+def make_items(n):
+    return [
+        QuestionImportItem(
+            content=f"Generated question #{i}?",
+            type="multiple_choice",
+            language="en",
+            options=["A", "B", "C", "D"],
+            correct_answer="A",
+            explanation="Generated for benchmarking.",
+        )
+        for i in range(n)
+    ]
+
+def orm_upload(session, notebook_id, items):
+    """The original upload path: one ORM object per item."""
+    for q in items:
+        session.add(Question(
+            notebook_id=notebook_id,
+            content=q.content,
+            type=q.type,
+            language=q.language,
+            options=q.options,
+            correct_answer=q.correct_answer,
+            explanation=q.explanation
+        ))
+    session.commit()
+
+def bulk_upload(session, notebook_id, items):
+    QuestionService.bulk_insert_questions(session, notebook_id, items)
+
+def timed(fn, notebook_id, items):
+    with Session(engine) as session:
+        start = time.perf_counter()
+        fn(session, notebook_id, items)
+        elapsed = time.perf_counter() - start
+        session.execute(delete(Question).where(Question.notebook_id == notebook_id))
+        session.commit()
+    return elapsed
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        notebook = Notebook(name="bench-upload")
+        session.add(notebook)
+        session.commit()
+        notebook_id = notebook.id
+
+    print(f"backend: {engine.dialect.name}")
+    print(f"{'items':>8} {'orm rows/s':>12} {'bulk rows/s':>12} {'speedup':>8}")
+    for n in sizes:
+        items = make_items(n)
+        orm = timed(orm_upload, notebook_id, items)
+        bulk = timed(bulk_upload, notebook_id, items)
+        print(f"{n:>8} {n / orm:>12.0f} {n / bulk:>12.0f} {orm / bulk:>7.1f}x")
+
+    with Session(engine) as session:
+        session.execute(delete(Notebook).where(Notebook.id == notebook_id))
+        session.commit()
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 from fastapi import FastAPI
 from app.core.database import init_db
-from app.routers import notebooks, questions, stats, tools
+from app.routers import notebooks, questions, stats, study, system, tools
+from app.services.attempt_writer import WRITE_BEHIND_ENABLED, attempt_writer
+from app.services.pdf_service import PdfService, split_queue
 
 app = FastAPI(title="Question Solver API")
 
 # Include Routers
 app.include_router(notebooks.router)
 app.include_router(questions.router)
+app.include_router(study.router)
 app.include_router(stats.router)
 app.include_router(tools.router)
+app.include_router(system.router)
 
 @app.get("/")
 def read_root():
@@ -17,3 +21,12 @@ def read_root():
 @app.on_event("startup")
 def on_startup():
     init_db()
+    if WRITE_BEHIND_ENABLED:
+        attempt_writer.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Commit every queued attempt before the process exits
+    attempt_writer.stop()
+    split_queue.shutdown()
+    PdfService.shutdown()
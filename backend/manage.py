@@ -0,0 +1,72 @@
+"""Maintenance commands for the Question Solver backend.
+
+Usage (from the backend directory, with DATABASE_URL set):
+    python manage.py migrate
+    python manage.py rebuild-status
+    python manage.py rebuild-closure
+    python manage.py backfill-hashes
+    python manage.py rebuild-activity
+    python manage.py check-counters
+    python manage.py rebuild-counters
+"""
+import argparse
+from sqlmodel import Session
+from app.core.database import applied_versions, engine, init_db
+from app.services.notebook_service import NotebookService
+from app.services.question_service import QuestionService
+
+def migrate(session: Session):
+    # init_db() has already applied any pending migration by the time commands run
+    versions = applied_versions(engine)
+    print(f"Schema is at migration {max(versions) if versions else 0} (applied: {versions}).")
+
+def rebuild_status(session: Session):
+    count = QuestionService.rebuild_statuses(session)
+    print(f"Rebuilt status for {count} questions.")
+
+def rebuild_closure(session: Session):
+    count = NotebookService.rebuild_closure(session)
+    print(f"Rebuilt {count} notebook ancestry rows.")
+
+def backfill_hashes(session: Session):
+    hashed, duplicates = QuestionService.backfill_content_hashes(session)
+    print(f"Hashed {hashed} questions; {duplicates} duplicates left unhashed.")
+
+def rebuild_activity(session: Session):
+    count = QuestionService.rebuild_daily_activity(session)
+    print(f"Rebuilt {count} daily activity rows.")
+
+def check_counters(session: Session):
+    drift = NotebookService.check_counters(session)
+    for notebook_id, (stored, actual) in drift.items():
+        print(f"Notebook {notebook_id}: stored total/attempted/correct {stored}, actual {actual}")
+    if drift:
+        print(f"{len(drift)} notebooks have drifted; run 'rebuild-counters' to fix them.")
+        raise SystemExit(1)
+    print("Notebook counters are consistent.")
+
+def rebuild_counters(session: Session):
+    count = NotebookService.rebuild_counters(session)
+    print(f"Rebuilt counters for {count} notebooks.")
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-status": rebuild_status,
+    "rebuild-closure": rebuild_closure,
+    "backfill-hashes": backfill_hashes,
+    "rebuild-activity": rebuild_activity,
+    "check-counters": check_counters,
+    "rebuild-counters": rebuild_counters,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Question Solver maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+
+    init_db()
+    with Session(engine) as session:
+        COMMANDS[args.command](session)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
 import os
+import re
 # Set dummy env var before importing database module to avoid crash
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 from main import app
-from app.core.database import get_session
+from app.core.cache import answer_key_cache, stats_cache
+from app.core.database import get_async_session, get_session
 from app.models import Notebook, Question, Attempt
 
 # Use an in-memory SQLite database for testing
@@ -14,6 +19,8 @@ sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
 engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+# Route handlers use the async engine; TestClient runs each request on a fresh event loop, so don't pool
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{sqlite_file_name}", poolclass=NullPool)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
@@ -27,13 +34,21 @@ def session_fixture():
     with Session(engine) as session:
         yield session
     drop_db_and_tables()
+    # Ids are reused by the next test's fresh database
+    stats_cache.clear()
+    answer_key_cache.clear()
 
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -138,10 +153,15 @@ def test_question_flow(client: TestClient):
     assert stats["incorrect"] == 1
     assert stats["accuracy"] == 0.5
 
-def test_pdf_split(client: TestClient):
+def test_pdf_split(client: TestClient, monkeypatch):
     # Create a dummy PDF in memory
-    from pypdf import PdfWriter
+    from pypdf import PdfReader, PdfWriter
     import io
+    from app.services.pdf_service import PdfService
+
+    workdirs = []
+    make_workdir = PdfService.make_workdir
+    monkeypatch.setattr(PdfService, "make_workdir", lambda: workdirs.append(make_workdir()) or workdirs[-1])
     
     writer = PdfWriter()
     writer.add_blank_page(width=100, height=100) # Page 1
@@ -168,6 +188,105 @@ def test_pdf_split(client: TestClient):
         assert len(z.namelist()) == 2
         assert "split_1-2.pdf" in z.namelist()
         assert "split_3-3.pdf" in z.namelist()
+        assert len(PdfReader(io.BytesIO(z.read("split_1-2.pdf"))).pages) == 2
+
+    # The spooled upload, chunks and ZIP are removed once the response is sent
+    assert workdirs and not os.path.exists(workdirs[0])
+    assert client.post("/tools/split-pdf", files=files, data={"chunk_size": 0}).status_code == 422
+
+def test_pdf_split_parallel(tmp_path):
+    from pypdf import PdfReader, PdfWriter
+    import io
+    import zipfile
+    import sys
+    from app.services.pdf_service import PDF_RECURSION_LIMIT, PdfService
+
+    writer = PdfWriter()
+    for i in range(7):
+        writer.add_blank_page(width=100 + i, height=100)
+    source_path = str(tmp_path / "source.pdf")
+    writer.write(source_path)
+
+    # A process pool must produce the same chunks, in the same order, as the serial path
+    names = {}
+    for workers in (1, 2):
+        zip_path = str(tmp_path / f"split-{workers}.zip")
+        assert PdfService.split_pdf(source_path, 3, zip_path, workers=workers) == 3
+        with zipfile.ZipFile(zip_path) as z:
+            names[workers] = z.namelist()
+            widths = [float(page.mediabox.width) for name in z.namelist() for page in PdfReader(io.BytesIO(z.read(name))).pages]
+        assert widths == [100 + i for i in range(7)]
+    assert names[1] == names[2] == ["split_1-3.pdf", "split_4-6.pdf", "split_7-7.pdf"]
+    # Chunk files are zipped and removed as they complete
+    assert sorted(os.listdir(tmp_path)) == ["source.pdf", "split-1.zip", "split-2.zip"]
+    # Spawned workers parse with the same recursion limit as the serial path
+    assert PdfService._pool(2).submit(sys.getrecursionlimit).result() == PDF_RECURSION_LIMIT
+
+def test_pdf_split_off_event_loop(monkeypatch):
+    import asyncio
+    import io
+    import threading
+    import time
+    import httpx
+    from pypdf import PdfWriter
+    from app.services.pdf_service import PdfService, split_queue
+
+    writer = PdfWriter()
+    writer.add_blank_page(width=100, height=100)
+    pdf_bytes = io.BytesIO()
+    writer.write(pdf_bytes)
+
+    # A split that holds its thread until released, standing in for a large PDF; the timeout
+    # keeps a blocked event loop from hanging the test
+    started, release = threading.Event(), threading.Event()
+    timed_out = []
+    split_pdf = PdfService.split_pdf
+    def slow_split(*args, **kwargs):
+        started.set()
+        if not release.wait(timeout=3):
+            timed_out.append(True)
+        return split_pdf(*args, **kwargs)
+    monkeypatch.setattr(PdfService, "split_pdf", staticmethod(slow_split))
+    monkeypatch.setattr(split_queue, "max_running", 1)
+    monkeypatch.setattr(split_queue, "max_waiting", 0)
+
+    def upload():
+        return {"file": ("big.pdf", pdf_bytes.getvalue(), "application/pdf")}, {"chunk_size": "1"}
+
+    async def scenario():
+        # One event loop for every request, as in a single uvicorn worker
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files, data = upload()
+            split = asyncio.create_task(client.post("/tools/split-pdf", files=files, data=data))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+
+            latencies = []
+            for _ in range(5):
+                t0 = time.perf_counter()
+                assert (await client.get("/")).status_code == 200
+                latencies.append(time.perf_counter() - t0)
+
+            # The only slot is taken and no waiting is allowed
+            files, data = upload()
+            rejected = await client.post("/tools/split-pdf", files=files, data=data)
+            metrics = (await client.get("/system/metrics")).json()["pdf_split"]
+
+            # All of the above was answered while the split was still running
+            assert not split.done()
+            release.set()
+            return latencies, rejected, metrics, await split
+
+    latencies, rejected, metrics, res = asyncio.run(scenario())
+    assert not timed_out
+    assert max(latencies) < 0.5, latencies
+    assert rejected.status_code == 429
+    assert rejected.headers["retry-after"] == "10"
+    assert (metrics["running"], metrics["waiting"], metrics["rejected"]) == (1, 0, 1)
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/zip"
+    assert split_queue.in_flight == 0
 
 def test_question_management(client: TestClient):
     # Setup: Create notebook and upload question
@@ -209,3 +328,862 @@ def test_global_stats(client: TestClient):
     stats = res.json()
     assert "total_questions" in stats
     assert "accuracy" in stats
+
+def _upload(client: TestClient, nb_id: int, contents):
+    payload = {
+        "questions": [
+            {
+                "content": content,
+                "type": "true_false",
+                "language": "en",
+                "options": ["True", "False"],
+                "correct_answer": "True",
+                "explanation": "..."
+            }
+            for content in contents
+        ]
+    }
+    return client.post(f"/questions/upload/{nb_id}", json=payload)
+
+def test_study_modes_and_status_rebuild(client: TestClient, session: Session):
+    from app.models import QuestionStatus
+    from app.services.question_service import QuestionService
+
+    nb_id = client.post("/notebooks/", json={"name": "Status"}).json()["id"]
+    _upload(client, nb_id, ["Q1", "Q2", "Q3"])
+    ids = {q["content"]: q["id"] for q in client.get(f"/study/{nb_id}").json()}
+
+    client.post("/attempt/", json={"question_id": ids["Q1"], "selected_option": "True"})
+    client.post("/attempt/", json={"question_id": ids["Q2"], "selected_option": "True"})
+    client.post("/attempt/", json={"question_id": ids["Q2"], "selected_option": "False"})
+
+    def contents(mode):
+        return [q["content"] for q in client.get(f"/study/{nb_id}?mode={mode}").json()]
+
+    assert contents("incorrect") == ["Q2"]
+    assert contents("unresolved") == ["Q3"]
+
+    status = session.get(QuestionStatus, ids["Q2"])
+    assert (status.attempt_count, status.correct_count, status.last_is_correct) == (2, 1, False)
+
+    # Rebuilding from raw attempts reproduces the incrementally maintained rows
+    assert QuestionService.rebuild_statuses(session) == 2
+    session.expire_all()
+    status = session.get(QuestionStatus, ids["Q2"])
+    assert (status.attempt_count, status.correct_count, status.last_is_correct) == (2, 1, False)
+    assert contents("incorrect") == ["Q2"]
+
+def test_activity_stats_aggregation(client: TestClient):
+    algebra = client.post("/notebooks/", json={"name": "Algebra"}).json()["id"]
+    history = client.post("/notebooks/", json={"name": "History"}).json()["id"]
+    _upload(client, algebra, ["A1", "A2"])
+    _upload(client, history, ["H1"])
+
+    for q in client.get(f"/study/{algebra}").json():
+        client.post("/attempt/", json={"question_id": q["id"], "selected_option": "True"})
+    h1 = client.get(f"/study/{history}").json()[0]
+    client.post("/attempt/", json={"question_id": h1["id"], "selected_option": "False"})
+    client.post("/attempt/", json={"question_id": h1["id"], "selected_option": "True"})
+
+    stats = client.get("/stats/global").json()
+    assert stats["total_questions"] == 3
+    assert stats["attempted"] == 3
+    assert stats["correct"] == 3
+    assert stats["questions_today"] == 4
+    assert stats["questions_week"] == 4
+    assert stats["questions_month"] == 4
+    assert stats["category_stats"] == {"Algebra": 2, "History": 2}
+
+    stats = client.get(f"/stats/{history}").json()
+    assert stats["total_questions"] == 1
+    assert stats["questions_today"] == 2
+
+def test_daily_activity_rollup(client: TestClient, session: Session):
+    from datetime import datetime, timedelta, timezone
+    from app.models import DailyActivity
+    from app.services.question_service import QuestionService
+
+    parent = client.post("/notebooks/", json={"name": "Rollup"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Child", "parent_id": parent}).json()["id"]
+    _upload(client, child, ["R1", "R2"])
+    r1, r2 = [q["id"] for q in client.get(f"/study/{child}").json()]
+    client.post("/attempt/", json={"question_id": r1, "selected_option": "True"})
+    client.post("/attempt/", json={"question_id": r1, "selected_option": "False"})
+    client.post("/attempt/", json={"question_id": r2, "selected_option": "True"})
+
+    today = datetime.now(timezone.utc).date()
+    row = session.get(DailyActivity, (child, today))
+    assert (row.attempts, row.correct) == (3, 2)
+
+    # Attempts from earlier days only count towards the windows they fall in
+    session.add(Attempt(question_id=r2, is_correct=True, timestamp=datetime.now(timezone.utc) - timedelta(days=40)))
+    session.commit()
+    assert QuestionService.rebuild_daily_activity(session) == 2
+    session.expire_all()
+    row = session.get(DailyActivity, (child, today))
+    assert (row.attempts, row.correct) == (3, 2)
+
+    stats = client.get(f"/stats/{parent}").json()
+    assert (stats["questions_today"], stats["questions_month"]) == (3, 3)
+    assert client.get("/stats/global").json()["category_stats"] == {"Rollup": 4}
+
+    # Deleting a question takes its attempts out of the rollup
+    client.delete(f"/questions/{r1}")
+    session.expire_all()
+    row = session.get(DailyActivity, (child, today))
+    assert (row.attempts, row.correct) == (1, 1)
+    assert client.get(f"/stats/{parent}").json()["questions_today"] == 1
+
+def test_notebook_counters_roll_up(client: TestClient, session: Session):
+    from app.models import NotebookCounter
+    from app.services.notebook_service import NotebookService
+
+    root = client.post("/notebooks/", json={"name": "Root"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Child", "parent_id": root}).json()["id"]
+    other = client.post("/notebooks/", json={"name": "Other"}).json()["id"]
+    _upload(client, child, ["C1", "C2", "C3"])
+    _upload(client, child, ["C1"])  # duplicate, skipped
+    _upload(client, root, ["R1"])
+    c1, c2, c3 = [q["id"] for q in client.get(f"/study/{child}").json()]
+
+    client.post("/attempt/", json={"question_id": c1, "selected_option": "True"})
+    client.post("/attempt/", json={"question_id": c2, "selected_option": "False"})
+    client.post("/attempt/", json={"question_id": c2, "selected_option": "True"})
+    client.post("/attempt/", json={"question_id": c1, "selected_option": "False"})
+
+    def counts(notebook_id):
+        stats = client.get(f"/stats/{notebook_id}").json()
+        return stats["total_questions"], stats["attempted"], stats["correct"], stats["incorrect"]
+
+    assert counts(child) == (3, 2, 1, 1)
+    assert counts(root) == (4, 2, 1, 1)
+
+    client.delete(f"/questions/{c2}")
+    assert counts(root) == (3, 1, 0, 1)
+
+    # Moving the child carries its counts to the new parent
+    client.patch(f"/notebooks/{child}", json={"parent_id": other})
+    assert counts(root) == (1, 0, 0, 0)
+    assert counts(other) == (2, 1, 0, 1)
+    assert NotebookService.check_counters(session) == {}
+
+    # The checker reports drift and a rebuild repairs it
+    counter = session.get(NotebookCounter, other)
+    counter.total = 99
+    session.add(counter)
+    session.commit()
+    assert NotebookService.check_counters(session) == {other: ((99, 1, 0), (2, 1, 0))}
+    NotebookService.rebuild_counters(session)
+    assert NotebookService.check_counters(session) == {}
+
+    client.delete(f"/notebooks/{child}")
+    assert counts(other) == (0, 0, 0, 0)
+    assert NotebookService.check_counters(session) == {}
+
+def test_stats_cache_and_etags(client: TestClient):
+    from app.core.cache import LRUCache
+
+    root = client.post("/notebooks/", json={"name": "Cached"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Leaf", "parent_id": root}).json()["id"]
+    _upload(client, child, ["E1", "E2"])
+
+    first = client.get(f"/stats/{root}")
+    etag = first.headers["ETag"]
+    assert first.json()["total_questions"] == 2
+    unchanged = client.get(f"/stats/{root}", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    global_etag = client.get("/stats/global").headers["ETag"]
+
+    # An attempt in the child invalidates the whole ancestor chain and the global stats
+    question_id = client.get(f"/study/{child}").json()[0]["id"]
+    client.post("/attempt/", json={"question_id": question_id, "selected_option": "True"})
+    changed = client.get(f"/stats/{root}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["attempted"] == 1
+    assert changed.headers["ETag"] != etag
+    assert client.get("/stats/global", headers={"If-None-Match": global_etag}).status_code == 200
+
+    client.delete(f"/questions/{question_id}")
+    assert client.get(f"/stats/{root}").json()["total_questions"] == 1
+    _upload(client, child, ["E3"])
+    assert client.get(f"/stats/{root}").json()["total_questions"] == 2
+    client.delete(f"/notebooks/{child}")
+    assert client.get(f"/stats/{root}").json()["total_questions"] == 0
+
+    # Renaming a root notebook renames its category in the global stats
+    question_id = _upload(client, root, ["E4"]).json()["ids"][0]
+    client.post("/attempt/", json={"question_id": question_id, "selected_option": "True"})
+    global_res = client.get("/stats/global")
+    assert global_res.json()["category_stats"] == {"Cached": 1}
+    client.patch(f"/notebooks/{root}", json={"name": "Renamed"})
+    renamed = client.get("/stats/global", headers={"If-None-Match": global_res.headers["ETag"]})
+    assert renamed.status_code == 200
+    assert renamed.json()["category_stats"] == {"Renamed": 1}
+
+    lru = LRUCache(2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+    assert "b" not in lru and lru.get("a") == 1 and lru.get("c") == 3
+
+def test_tree_and_batch_stats(client: TestClient):
+    root = client.post("/notebooks/", json={"name": "Tree"}).json()["id"]
+    left = client.post("/notebooks/", json={"name": "Left", "parent_id": root}).json()["id"]
+    right = client.post("/notebooks/", json={"name": "Right", "parent_id": root}).json()["id"]
+    _upload(client, left, ["L1", "L2"])
+    _upload(client, right, ["R1"])
+    for q in client.get(f"/study/{left}").json():
+        client.post("/attempt/", json={"question_id": q["id"], "selected_option": "True"})
+
+    res = client.get("/stats/tree")
+    tree = res.json()
+    assert set(tree) == {str(root), str(left), str(right)}
+    for notebook_id in [root, left, right]:
+        assert tree[str(notebook_id)] == client.get(f"/stats/{notebook_id}").json()
+    assert (tree[str(root)]["total_questions"], tree[str(root)]["questions_today"]) == (3, 2)
+    assert client.get("/stats/tree", headers={"If-None-Match": res.headers["ETag"]}).status_code == 304
+
+    batch = client.get(f"/stats/batch?ids={left},{right},9999").json()
+    assert set(batch) == {str(left), str(right)}
+    assert batch[str(right)]["total_questions"] == 1
+    assert client.get("/stats/batch?ids=1,x").status_code == 422
+
+def test_batch_attempts(client: TestClient, session: Session):
+    from app.models import QuestionStatus
+    from app.services.notebook_service import NotebookService
+
+    nb_id = client.post("/notebooks/", json={"name": "Batch"}).json()["id"]
+    _upload(client, nb_id, ["B1", "B2"])
+    b1, b2 = [q["id"] for q in client.get(f"/study/{nb_id}").json()]
+    client.post("/attempt/", json={"question_id": b2, "selected_option": "True"})
+
+    res = client.post("/attempts/batch", json={"attempts": [
+        {"question_id": b1, "selected_option": "True", "answered_at": "2024-01-01T10:00:00Z"},
+        {"question_id": 99999, "selected_option": "True"},
+        {"question_id": b1, "selected_option": "False", "answered_at": "2024-01-01T09:00:00Z"},
+        {"question_id": b2, "selected_option": "False", "answered_at": "2024-01-02T10:00:00+02:00"},
+    ]})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["recorded"] == 3
+    assert [r["question_id"] for r in body["results"]] == [b1, 99999, b1, b2]
+    assert [r["result"] and r["result"]["is_correct"] for r in body["results"]] == [True, None, False, False]
+
+    # Buffered answers are applied in answer order; older ones don't override the latest result
+    status = session.get(QuestionStatus, b1)
+    assert (status.attempt_count, status.correct_count, status.last_is_correct) == (2, 1, True)
+    status = session.get(QuestionStatus, b2)
+    assert (status.attempt_count, status.correct_count, status.last_is_correct) == (2, 1, True)
+
+    stats = client.get(f"/stats/{nb_id}").json()
+    assert (stats["attempted"], stats["correct"], stats["questions_today"]) == (2, 2, 1)
+    assert NotebookService.check_counters(session) == {}
+    assert client.post("/attempts/batch", json={"attempts": []}).status_code == 422
+
+def test_timestamps_bind_as_naive_utc(client: TestClient, session: Session):
+    from datetime import datetime
+    from sqlalchemy import event
+
+    nb_id = client.post("/notebooks/", json={"name": "Naive"}).json()["id"]
+    question_id = _upload(client, nb_id, ["N1"]).json()["ids"][0]
+
+    # asyncpg rejects aware datetimes for TIMESTAMP columns; SQLite would store them silently.
+    # compiled_parameters are the values handed to the column types, before SQLite turns them into strings
+    bound = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        for row in context.compiled_parameters:
+            bound.extend(value for value in row.values() if isinstance(value, datetime))
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        assert client.post("/attempt/", json={"question_id": question_id, "selected_option": "True"}).status_code == 200
+        res = client.post("/attempts/batch", json={"attempts": [
+            {"question_id": question_id, "selected_option": "False", "answered_at": "2024-01-02T10:00:00+02:00"},
+        ]})
+        assert res.status_code == 200
+        assert client.post("/study/sessions/", json={"notebook_id": nb_id}).status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert bound and all(value.tzinfo is None for value in bound)
+    assert datetime(2024, 1, 2, 8, 0) in bound
+
+def test_status_updates_are_atomic(client: TestClient, session: Session):
+    from app.models import QuestionStatus
+    from app.services.notebook_service import NotebookService
+    from app.services.question_service import QuestionService
+
+    nb_id = client.post("/notebooks/", json={"name": "Race"}).json()["id"]
+    question_id = _upload(client, nb_id, ["R1"]).json()["ids"][0]
+
+    # Two first answers: the one that finds the row already there folds into it
+    with Session(engine) as other:
+        QuestionService.submit_attempt(other, question_id, "False")
+    QuestionService.submit_attempt(session, question_id, "True")
+    # session now holds the status row; another session answers behind its back
+    held = session.get(QuestionStatus, question_id)
+    assert held.attempt_count == 2
+    with Session(engine) as other:
+        QuestionService.submit_attempt(other, question_id, "True")
+    QuestionService.submit_attempt(session, question_id, "False")
+
+    session.expire_all()
+    status = session.get(QuestionStatus, question_id)
+    assert (status.attempt_count, status.correct_count, status.last_is_correct) == (4, 2, False)
+    assert NotebookService.check_counters(session) == {}
+    stats = client.get(f"/stats/{nb_id}").json()
+    assert (stats["attempted"], stats["correct"]) == (1, 0)
+
+def test_write_behind_attempts(client: TestClient, session: Session, monkeypatch):
+    from app.models import QuestionStatus
+    from app.services.attempt_writer import attempt_writer
+
+    nb_id = client.post("/notebooks/", json={"name": "Write-behind"}).json()["id"]
+    _upload(client, nb_id, ["W1", "W2"])
+    w1, w2 = [q["id"] for q in client.get(f"/study/{nb_id}").json()]
+
+    # A long flush interval keeps the attempts queued until stop() flushes them
+    monkeypatch.setattr(attempt_writer, "session_factory", lambda: Session(engine))
+    monkeypatch.setattr(attempt_writer, "flush_interval", 5.0)
+    attempt_writer.start()
+    try:
+        res = client.post("/attempt/", json={"question_id": w1, "selected_option": "True"})
+        assert res.json() == {"is_correct": True, "correct_answer": "True", "explanation": "..."}
+        client.post("/attempt/", json={"question_id": w1, "selected_option": "False"})
+        client.post("/attempt/", json={"question_id": w2, "selected_option": "False"})
+        assert client.post("/attempt/", json={"question_id": 99999, "selected_option": "True"}).status_code == 404
+        assert client.get("/system/metrics").json()["attempt_writer"]["queue_depth"] == 3
+        assert session.get(QuestionStatus, w1) is None
+    finally:
+        attempt_writer.stop()
+
+    metrics = client.get("/system/metrics").json()["attempt_writer"]
+    assert (metrics["running"], metrics["queue_depth"], metrics["written"]) == (False, 0, 3)
+    status = session.get(QuestionStatus, w1)
+    assert (status.attempt_count, status.last_is_correct) == (2, False)
+    assert client.get(f"/stats/{nb_id}").json()["attempted"] == 2
+
+    # Stopped: answers are committed synchronously again
+    client.post("/attempt/", json={"question_id": w2, "selected_option": "True"})
+    session.expire_all()
+    assert session.get(QuestionStatus, w2).attempt_count == 2
+
+def test_answer_key_cache(client: TestClient, session: Session):
+    from sqlalchemy import event
+    from app.services.question_service import QuestionService
+
+    root = client.post("/notebooks/", json={"name": "Keys"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Sub", "parent_id": root}).json()["id"]
+    _upload(client, child, ["K1", "K2", "K3"])
+    study = client.post("/study/sessions/", json={"notebook_id": child}).json()
+    k1, k2, k3 = [item["question"]["id"] for item in client.get(f"/study/sessions/{study['id']}/questions").json()]
+
+    # Fetching the session window warmed the keys: grading is a hit
+    before = client.get("/system/metrics").json()["answer_key_cache"]
+    assert before["size"] == 3
+    client.post("/attempt/", json={"question_id": k1, "selected_option": "True"})
+    after = client.get("/system/metrics").json()["answer_key_cache"]
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (1, 0)
+
+    # The sync path grades without loading the Question row
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert QuestionService.submit_attempt(session, k2, "False")["is_correct"] is False
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements and not any(re.search(r"FROM question\b", statement) for statement in statements)
+
+    client.delete(f"/questions/{k1}")
+    assert k1 not in answer_key_cache
+    assert client.post("/attempt/", json={"question_id": k1, "selected_option": "True"}).status_code == 404
+    client.delete(f"/notebooks/{root}")
+    assert k2 not in answer_key_cache and k3 not in answer_key_cache
+
+def test_notebook_delete_cascades(client: TestClient, session: Session):
+    from sqlalchemy import func
+    from app.models import DailyActivity, NotebookClosure, QuestionStatus, StudySession
+    from app.services.notebook_service import NotebookService
+
+    root = client.post("/notebooks/", json={"name": "Doomed"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Doomed child", "parent_id": root}).json()["id"]
+    keep = client.post("/notebooks/", json={"name": "Kept"}).json()["id"]
+    for nb_id, contents in [(root, ["D1"]), (child, ["D2", "D3"]), (keep, ["K1"])]:
+        _upload(client, nb_id, contents)
+        for q in client.get(f"/study/{nb_id}").json():
+            client.post("/attempt/", json={"question_id": q["id"], "selected_option": "True"})
+    client.post("/study/sessions/", json={"notebook_id": child})
+
+    assert client.delete(f"/notebooks/{root}").status_code == 200
+
+    def count(model, *conditions):
+        return session.exec(select(func.count()).select_from(model).where(*conditions)).one()
+
+    assert count(Notebook) == 1
+    assert count(Question) == count(Attempt) == count(QuestionStatus) == count(DailyActivity) == 1
+    assert count(StudySession) == 0
+    assert count(NotebookClosure, NotebookClosure.ancestor_id != keep) == 0
+    assert NotebookService.check_counters(session) == {}
+    assert client.get("/stats/global").json()["total_questions"] == 1
+
+def test_subtree_resolution(client: TestClient, session: Session):
+    from app.services.notebook_service import NotebookService
+
+    root = client.post("/notebooks/", json={"name": "Root"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Child", "parent_id": root}).json()["id"]
+    grandchild = client.post("/notebooks/", json={"name": "Grandchild", "parent_id": child}).json()["id"]
+    other = client.post("/notebooks/", json={"name": "Other"}).json()["id"]
+
+    assert sorted(NotebookService.get_subtree_ids(session, root)) == sorted([root, child, grandchild])
+    assert NotebookService.get_subtree_ids(session, grandchild) == [grandchild]
+
+    _upload(client, grandchild, ["Deep"])
+    _upload(client, other, ["Elsewhere"])
+    assert [q["content"] for q in client.get(f"/study/{root}").json()] == ["Deep"]
+    assert client.get(f"/stats/{child}").json()["total_questions"] == 1
+
+def test_notebook_closure_moves_and_breadcrumbs(client: TestClient, session: Session):
+    from app.models import NotebookClosure
+    from app.services.notebook_service import NotebookService
+
+    science = client.post("/notebooks/", json={"name": "Science"}).json()["id"]
+    physics = client.post("/notebooks/", json={"name": "Physics", "parent_id": science}).json()["id"]
+    quantum = client.post("/notebooks/", json={"name": "Quantum", "parent_id": physics}).json()["id"]
+    math = client.post("/notebooks/", json={"name": "Math"}).json()["id"]
+    assert client.post("/notebooks/", json={"name": "Orphan", "parent_id": 9999}).status_code == 404
+
+    res = client.get(f"/notebooks/{quantum}/breadcrumbs")
+    assert [b["name"] for b in res.json()] == ["Science", "Physics", "Quantum"]
+
+    # Moving a subtree under itself is rejected
+    assert client.patch(f"/notebooks/{science}", json={"parent_id": quantum}).status_code == 400
+
+    # Re-parent Physics (and Quantum with it) under Math
+    res = client.patch(f"/notebooks/{physics}", json={"parent_id": math})
+    assert res.status_code == 200
+    assert res.json()["parent_id"] == math
+    res = client.get(f"/notebooks/{quantum}/breadcrumbs")
+    assert [b["name"] for b in res.json()] == ["Math", "Physics", "Quantum"]
+    assert NotebookService.get_subtree_ids(session, science) == [science]
+
+    # Category stats roll up to the root notebook
+    _upload(client, quantum, ["Q"])
+    q = client.get(f"/study/{quantum}").json()[0]
+    client.post("/attempt/", json={"question_id": q["id"], "selected_option": "True"})
+    assert client.get("/stats/global").json()["category_stats"] == {"Math": 1}
+
+    # The backfill reproduces the incrementally maintained closure
+    def closure_rows():
+        return sorted((c.ancestor_id, c.descendant_id, c.depth) for c in session.exec(select(NotebookClosure)).all())
+
+    before = closure_rows()
+    NotebookService.rebuild_closure(session)
+    assert closure_rows() == before
+
+    # Deleting a notebook removes its whole subtree
+    client.delete(f"/notebooks/{math}")
+    assert [nb["name"] for nb in client.get("/notebooks/").json()] == ["Science"]
+    assert client.get(f"/notebooks/{quantum}/breadcrumbs").status_code == 404
+
+def test_bulk_upload_returns_ids_in_order(client: TestClient, session: Session):
+    nb_id = client.post("/notebooks/", json={"name": "Bulk"}).json()["id"]
+    res = _upload(client, nb_id, [f"Q{i}" for i in range(25)])
+    assert res.status_code == 200
+    ids = res.json()["ids"]
+    assert len(ids) == 25
+
+    stored = {q.id: q.content for q in session.exec(select(Question).where(Question.notebook_id == nb_id)).all()}
+    assert [stored[i] for i in ids] == [f"Q{i}" for i in range(25)]
+    assert stored[ids[0]] == "Q0" and session.get(Question, ids[0]).options == ["True", "False"]
+
+def test_postgres_copy_matches_driver():
+    import asyncio
+    from types import SimpleNamespace
+    from sqlalchemy.util import greenlet_spawn
+    from app.services.question_service import QuestionService
+
+    # The Postgres drivers aren't installed here, so stand in for their raw connections
+    copies = []
+    class AsyncpgConnection:
+        async def copy_records_to_table(self, table_name, records, columns):
+            copies.append(("asyncpg", table_name, records, columns))
+    class Psycopg2Cursor:
+        def copy_expert(self, sql, file):
+            copies.append(("psycopg2", sql, file.read()))
+        def close(self):
+            pass
+    class Psycopg2Connection:
+        def cursor(self):
+            return Psycopg2Cursor()
+
+    def postgres_session(driver, driver_connection):
+        return SimpleNamespace(
+            get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="postgresql", driver=driver)),
+            connection=lambda: SimpleNamespace(connection=SimpleNamespace(driver_connection=driver_connection)),
+        )
+
+    records = [[1, "Q", "true_false", "en", '["True", "False"]', "True", "", "abc"]]
+    # AsyncSession.run_sync runs the sync service on a greenlet, as greenlet_spawn does here
+    asyncio.run(greenlet_spawn(QuestionService._copy_to_staging, postgres_session("asyncpg", AsyncpgConnection()), records))
+    QuestionService._copy_to_staging(postgres_session("psycopg2", Psycopg2Connection()), records)
+
+    assert copies[0] == ("asyncpg", "question_import", records, QuestionService.IMPORT_COLUMNS)
+    assert copies[1][0] == "psycopg2" and copies[1][1].startswith("COPY question_import (notebook_id, content,")
+    # An empty explanation must reach Postgres as '' rather than NULL
+    assert copies[1][2] == '"1","Q","true_false","en","[""True"", ""False""]","True","","abc"\r\n'
+
+def test_stream_upload_ndjson_and_array(client: TestClient, monkeypatch):
+    import json
+    from app.services.ingest_service import IngestService
+
+    nb_id = client.post("/notebooks/", json={"name": "Stream"}).json()["id"]
+    item = {
+        "type": "true_false",
+        "language": "en",
+        "options": ["True", "False"],
+        "correct_answer": "True",
+        "explanation": "..."
+    }
+    lines = [
+        json.dumps({**item, "content": "S1"}),
+        "{not json",
+        json.dumps({**item, "content": "S2"}),
+        json.dumps({"content": "missing fields"}),
+        "",
+        json.dumps({**item, "content": "S3"}),
+    ]
+    res = client.post(
+        f"/questions/upload/{nb_id}/stream?batch_size=2",
+        content="\n".join(lines).encode(),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert res.status_code == 200
+    body = res.json()
+    assert body["imported"] == 3
+    assert body["failed"] == 2
+    assert [e["index"] for e in body["errors"]] == [1, 3]
+
+    array = json.dumps([{**item, "content": "A1"}, 42, {**item, "content": "A2 ünïcode"}]).encode()
+    chunks = (array[i:i + 7] for i in range(0, len(array), 7))
+    res = client.post(f"/questions/upload/{nb_id}/stream", content=chunks)
+    assert res.json()["imported"] == 2
+    assert res.json()["errors"][0]["index"] == 1
+
+    res = client.post(f"/questions/upload/{nb_id}/stream", content=b'[{"content": "x"')
+    assert res.json()["errors"][-1]["index"] == -1
+
+    contents = [q["content"] for q in client.get(f"/questions/notebook/{nb_id}").json()]
+    assert contents == ["S1", "S2", "S3", "A1", "A2 ünïcode"]
+    assert client.post("/questions/upload/9999/stream", content=b"[]").status_code == 404
+
+    # NDJSON lines split across chunks are reassembled
+    ndjson = "\n".join(lines).encode()
+    res = client.post(f"/questions/upload/{nb_id}/stream", content=(ndjson[i:i + 5] for i in range(0, len(ndjson), 5)))
+    assert (res.json()["imported"], res.json()["skipped"], res.json()["failed"]) == (0, 3, 2)
+
+    # A line that keeps growing past MAX_ITEM_CHARS stops the import instead of buffering without bound
+    monkeypatch.setattr(IngestService, "MAX_ITEM_CHARS", 200)
+    endless = [json.dumps({**item, "content": "S4"}).encode() + b"\n", b'{"content": "'] + [b"x" * 50] * 10
+    res = client.post(f"/questions/upload/{nb_id}/stream", content=iter(endless)).json()
+    assert res["imported"] == 1
+    assert res["errors"] == [{"index": -1, "error": "Item 1 exceeds 200 characters"}]
+
+def test_duplicate_uploads_skip_or_upsert(client: TestClient, session: Session):
+    from app.schemas import QuestionImportItem
+    from app.services.notebook_service import NotebookService
+    from app.services.question_service import QuestionService
+
+    nb_id = client.post("/notebooks/", json={"name": "Dedup"}).json()["id"]
+    other_id = client.post("/notebooks/", json={"name": "Other"}).json()["id"]
+    first = _upload(client, nb_id, ["Same question", "Unique one"]).json()
+    assert len(first["ids"]) == 2
+
+    # Case and whitespace differences hash the same; duplicates inside one upload collapse too
+    res = _upload(client, nb_id, ["  same   QUESTION ", "New one", "New one"]).json()
+    assert res["message"] == "Imported 1 questions"
+    assert res["skipped"] == 2
+    assert len(client.get(f"/questions/notebook/{nb_id}").json()) == 3
+
+    # The same content in another notebook is not a duplicate
+    assert len(_upload(client, other_id, ["Same question"]).json()["ids"]) == 1
+
+    payload = {"questions": [{
+        "content": "Same question",
+        "type": "true_false",
+        "language": "en",
+        "options": ["False", "True"],
+        "correct_answer": "True",
+        "explanation": "Updated explanation"
+    }]}
+    payload["questions"].append({**payload["questions"][0], "content": "Brand new"})
+    res = client.post(f"/questions/upload/{nb_id}?on_duplicate=upsert", json=payload).json()
+    assert res["ids"][0] == first["ids"][0] and len(res["ids"]) == 2
+    session.expire_all()
+    assert session.get(Question, first["ids"][0]).explanation == "Updated explanation"
+    # Only the new row counts towards the notebook's questions
+    assert client.get(f"/stats/{nb_id}").json()["total_questions"] == 4
+    assert NotebookService.check_counters(session) == {}
+
+    # A grading that reads the old key while an upsert is in flight must not leave it cached
+    question_id = first["ids"][0]
+    with Session(engine) as writer:
+        def commit_after_grading():
+            with Session(engine) as reader:
+                QuestionService.get_answer_key(reader, question_id)
+            Session.commit(writer)
+        writer.commit = commit_after_grading
+        item = QuestionImportItem(**{**payload["questions"][0], "explanation": "Latest"})
+        QuestionService.bulk_insert_questions(writer, nb_id, [item], "upsert")
+    assert QuestionService.get_answer_key(session, question_id).explanation == "Latest"
+
+    # Backfill hashes legacy rows, leaving later duplicates unhashed
+    for content in ["Legacy", "legacy"]:
+        session.add(Question(notebook_id=nb_id, content=content, type="true_false", language="en",
+                             options=["True", "False"], correct_answer="True", explanation="..."))
+    session.commit()
+    assert QuestionService.backfill_content_hashes(session) == (1, 1)
+
+def test_keyset_pagination(client: TestClient):
+    from sqlalchemy import event
+
+    nb_id = client.post("/notebooks/", json={"name": "Paged"}).json()["id"]
+    child = client.post("/notebooks/", json={"name": "Paged child", "parent_id": nb_id}).json()["id"]
+    _upload(client, nb_id, [f"P{i}" for i in range(5)])
+    _upload(client, child, ["C1", "C2"])
+
+    # Totals come from the notebook counters, so no page counts rows
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement.lower())
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    seen = []
+    after = None
+    try:
+        while True:
+            params = {"limit": 2}
+            if after is not None:
+                params["after"] = after
+            res = client.get(f"/questions/notebook/{nb_id}", params=params)
+            # Only the notebook's own questions, not its child's
+            assert res.headers["X-Total-Count"] == "5"
+            seen.extend(q["content"] for q in res.json())
+            after = res.headers.get("X-Next-Cursor")
+            if after is None:
+                break
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    assert seen == [f"P{i}" for i in range(5)]
+    assert statements and not any("count(" in statement for statement in statements)
+    assert client.get(f"/study/{nb_id}", params={"limit": 2}).headers["X-Total-Count"] == "7"
+    client.delete(f"/notebooks/{child}")
+
+    # The study endpoint pages the filtered set the same way
+    first = client.get(f"/study/{nb_id}", params={"limit": 3}).json()
+    client.post("/attempt/", json={"question_id": first[0]["id"], "selected_option": "True"})
+    res = client.get(f"/study/{nb_id}", params={"mode": "unresolved", "limit": 3})
+    assert res.headers["X-Total-Count"] == "4"
+    assert [q["content"] for q in res.json()] == ["P1", "P2", "P3"]
+    res = client.get(f"/study/{nb_id}", params={"mode": "unresolved", "limit": 3, "after": res.headers["X-Next-Cursor"]})
+    assert [q["content"] for q in res.json()] == ["P4"]
+    assert "X-Next-Cursor" not in res.headers
+
+def test_study_sessions(client: TestClient):
+    nb_id = client.post("/notebooks/", json={"name": "Sessions"}).json()["id"]
+    ids = _upload(client, nb_id, [f"S{i}" for i in range(6)]).json()["ids"]
+    client.post("/attempt/", json={"question_id": ids[0], "selected_option": "True"})
+
+    res = client.post("/study/sessions/", json={"notebook_id": nb_id, "mode": "unresolved"})
+    assert res.status_code == 200
+    study = res.json()
+    assert study["total"] == 5 and study["position"] == 0 and study["seed"] is None
+
+    items = client.get(f"/study/sessions/{study['id']}/questions", params={"limit": 2}).json()
+    assert [(i["position"], i["question"]["content"]) for i in items] == [(0, "S1"), (1, "S2")]
+
+    # Resuming serves from the saved position; deleted questions are skipped
+    client.patch(f"/study/sessions/{study['id']}", json={"position": 2})
+    client.delete(f"/questions/{ids[3]}")
+    items = client.get(f"/study/sessions/{study['id']}/questions", params={"limit": 2}).json()
+    assert [(i["position"], i["question"]["content"]) for i in items] == [(3, "S4")]
+    assert client.get(f"/study/sessions/{study['id']}").json()["position"] == 2
+
+    # The same seed reproduces the same permutation
+    def shuffled(seed):
+        study = client.post("/study/sessions/", json={"notebook_id": nb_id, "randomize": True, "seed": seed}).json()
+        items = client.get(f"/study/sessions/{study['id']}/questions", params={"limit": 100}).json()
+        return [i["question"]["id"] for i in items]
+
+    assert shuffled(7) == shuffled(7)
+    assert sorted(shuffled(7)) == sorted(i for i in ids if i != ids[3])
+
+    assert client.post("/study/sessions/", json={"notebook_id": 9999}).status_code == 404
+    assert client.get("/study/sessions/missing").status_code == 404
+
+def test_random_sampling(client: TestClient, session: Session):
+    from sqlalchemy import event
+    from app.services.question_service import QuestionService
+
+    nb_id = client.post("/notebooks/", json={"name": "Drill"}).json()["id"]
+    ids = _upload(client, nb_id, [f"D{i}" for i in range(60)]).json()["ids"]
+    for question_id in ids[:10]:
+        client.post("/attempt/", json={"question_id": question_id, "selected_option": "False"})
+
+    # Sparse sample: random ranks of the study set
+    sample = QuestionService.sample_question_ids(session, nb_id, "unresolved", 5)
+    assert len(sample) == len(set(sample)) == 5
+    assert set(sample) <= set(ids[10:])
+
+    # Dense sample and a sample larger than the set
+    dense = QuestionService.sample_question_ids(session, nb_id, "incorrect", 8)
+    assert len(set(dense)) == 8 and set(dense) <= set(ids[:10])
+    assert sorted(QuestionService.sample_question_ids(session, nb_id, "incorrect", 50)) == sorted(ids[:10])
+
+    res = client.get(f"/study/{nb_id}", params={"count": 7, "mode": "unresolved"})
+    assert len(res.json()) == 7
+    assert res.headers["X-Total-Count"] == "50"
+
+    study = client.post("/study/sessions/", json={"notebook_id": nb_id, "count": 4}).json()
+    assert study["total"] == 4
+
+    # Another notebook's upload leaves a gap in the ids; the id after it is drawn no more often than the rest
+    gapped = client.post("/notebooks/", json={"name": "Gapped"}).json()["id"]
+    before = _upload(client, gapped, [f"G{i}" for i in range(100)]).json()["ids"]
+    _upload(client, nb_id, [f"Filler{i}" for i in range(500)])
+    after = _upload(client, gapped, [f"H{i}" for i in range(100)]).json()["ids"]
+    assert after[0] - before[-1] > 500
+    statements = []
+    capture = lambda conn, cursor, statement, *args: statements.append(statement.lower())
+    event.listen(session.get_bind(), "before_cursor_execute", capture)
+    try:
+        drills = [QuestionService.sample_question_ids(session, gapped, "all", 10) for _ in range(200)]
+    finally:
+        event.remove(session.get_bind(), "before_cursor_execute", capture)
+    assert all(len(set(drill)) == 10 for drill in drills)
+    # Probes look ids up by key: nothing walks the set with OFFSET or counts it
+    assert statements and not any("offset" in statement or "count(" in statement for statement in statements)
+    # 5% expected; probing the id range picked it in nearly every drill
+    assert sum(after[0] in drill for drill in drills) < 40
+
+def _query_plan(session: Session, statement):
+    """SQLite EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement."""
+    compiled = statement.compile(dialect=session.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+    return [row[-1] for row in rows]
+
+def _assert_no_full_scans(plan, *tables):
+    for line in plan:
+        for table in tables:
+            assert not line.startswith(f"SCAN {table}"), f"Sequential scan of {table}: {plan}"
+
+def test_hot_queries_use_indexes(session: Session):
+    from sqlalchemy import func
+    from app.models import QuestionStatus
+    from app.services.notebook_service import NotebookService
+    from app.services.question_service import QuestionService
+
+    for mode in ["all", "incorrect", "unresolved"]:
+        statement = QuestionService._study_query(1, mode).order_by(Question.id).limit(50)
+        _assert_no_full_scans(_query_plan(session, statement), "question", "questionstatus", "notebookclosure")
+
+    latest = select(Attempt).where(Attempt.question_id == 1).order_by(Attempt.timestamp.desc()).limit(1)
+    plan = _query_plan(session, latest)
+    assert any("ix_attempt_question_id_timestamp" in line for line in plan), plan
+    assert not any("TEMP B-TREE" in line for line in plan), plan
+
+    stats = (
+        select(func.count(Question.id), func.count(QuestionStatus.question_id))
+        .select_from(Question)
+        .outerjoin(QuestionStatus, QuestionStatus.question_id == Question.id)
+        .where(Question.notebook_id.in_(NotebookService.subtree_ids_query(1)))
+    )
+    _assert_no_full_scans(_query_plan(session, stats), "question", "questionstatus")
+
+    activity = (
+        select(func.count(Attempt.id))
+        .select_from(Attempt)
+        .join(Question, Question.id == Attempt.question_id)
+        .where(Question.notebook_id.in_(NotebookService.subtree_ids_query(1)))
+    )
+    _assert_no_full_scans(_query_plan(session, activity), "question", "attempt")
+
+    children = select(Notebook).where(Notebook.parent_id == 1)
+    _assert_no_full_scans(_query_plan(session, children), "notebook")
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    from sqlalchemy import inspect, text
+    from app.core.migrations import MIGRATIONS, applied_versions, apply_migrations
+
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with legacy.begin() as conn:
+        conn.execute(text("CREATE TABLE notebook (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, parent_id INTEGER)"))
+        conn.execute(text(
+            "CREATE TABLE question (id INTEGER PRIMARY KEY, notebook_id INTEGER NOT NULL, content VARCHAR, "
+            "type VARCHAR, language VARCHAR, options JSON, correct_answer VARCHAR, explanation VARCHAR)"
+        ))
+        conn.execute(text("CREATE TABLE attempt (id INTEGER PRIMARY KEY, question_id INTEGER, is_correct BOOLEAN, timestamp DATETIME)"))
+        conn.execute(text("INSERT INTO notebook (id, name, parent_id) VALUES (1, 'Legacy', NULL), (2, 'Child', 1)"))
+        conn.execute(text(
+            "INSERT INTO question (id, notebook_id, content, language, options, correct_answer) VALUES "
+            "(1, 1, 'Q', 'en', '[\"True\", \"False\"]', 'True'), (2, 2, 'Wrong', 'en', '[\"True\", \"False\"]', 'True'), "
+            "(3, 2, 'Unseen', 'en', '[\"True\", \"False\"]', 'True'), (4, 1, ' q ', 'en', '[\"False\", \"True\"]', 'True')"
+        ))
+        conn.execute(text(
+            "INSERT INTO attempt (question_id, is_correct, timestamp) VALUES "
+            "(1, 1, '2024-03-01 09:00:00'), (1, 0, '2024-03-01 18:00:00'), (1, 1, '2024-03-02 08:00:00'), "
+            "(2, 0, '2024-03-02 09:00:00')"
+        ))
+
+    # As in init_db: create_all adds the missing tables but never alters existing ones
+    SQLModel.metadata.create_all(legacy)
+    assert apply_migrations(legacy) == [version for version, _, _ in MIGRATIONS]
+    assert apply_migrations(legacy) == []
+    assert applied_versions(legacy) == [version for version, _, _ in MIGRATIONS]
+
+    inspector = inspect(legacy)
+    assert "content_hash" in {c["name"] for c in inspector.get_columns("question")}
+    indexes = {i["name"] for table in ["notebook", "question", "attempt"] for i in inspector.get_indexes(table)}
+    assert {
+        "ix_question_notebook_content_hash",
+        "ix_attempt_question_id_timestamp",
+        "ix_question_notebook_id",
+        "ix_notebook_parent_id",
+    } <= indexes
+    # The backfills pin the derived tables to exactly these rows
+    def rows(sql):
+        with legacy.connect() as conn:
+            return [tuple(row) for row in conn.execute(text(sql)).all()]
+    assert rows("SELECT ancestor_id, descendant_id, depth FROM notebookclosure ORDER BY 1, 2") == [
+        (1, 1, 0), (1, 2, 1), (2, 2, 0)
+    ]
+    assert rows(
+        "SELECT question_id, last_is_correct, last_attempt_at, attempt_count, correct_count FROM questionstatus ORDER BY 1"
+    ) == [(1, 1, "2024-03-02 08:00:00", 3, 2), (2, 0, "2024-03-02 09:00:00", 1, 0)]
+    assert rows("SELECT notebook_id, day, attempts, correct FROM dailyactivity ORDER BY 1, 2") == [
+        (1, "2024-03-01", 2, 1), (1, "2024-03-02", 1, 1), (2, "2024-03-02", 1, 0)
+    ]
+    assert rows("SELECT notebook_id, total, attempted, correct FROM notebookcounter ORDER BY 1") == [
+        (1, 4, 2, 1), (2, 2, 1, 0)
+    ]
+    # Question 4 duplicates question 1, so only the older copy is hashed
+    hashes = dict(rows("SELECT id, content_hash FROM question"))
+    assert hashes[4] is None and None not in (hashes[1], hashes[2], hashes[3])
+
+    # The upgraded database serves the answered questions by their latest result
+    from app.schemas import QuestionImportItem
+    from app.services.notebook_service import NotebookService
+    from app.services.question_service import QuestionService
+    with Session(legacy) as legacy_session:
+        assert NotebookService.check_counters(legacy_session) == {}
+        incorrect, _ = QuestionService.get_study_questions(legacy_session, 1, "incorrect", False)
+        unresolved, _ = QuestionService.get_study_questions(legacy_session, 1, "unresolved", False)
+        assert [q.id for q in incorrect] == [2] and [q.id for q in unresolved] == [3, 4]
+        assert hashes[1] == QuestionService.content_hash(legacy_session.get(Question, 1))
+        # Re-uploading a legacy question is recognised as a duplicate
+        assert QuestionService.bulk_insert_questions(legacy_session, 2, [QuestionImportItem(
+            content="Unseen", type="true_false", language="en", options=["True", "False"], correct_answer="True", explanation="..."
+        )]) == []
@@ -1,3 +1,5 @@
+import os
+import time
 import streamlit as st
 from utils.styles import load_css
 from views import home, study_setup, study_session, tools, metrics
@@ -13,8 +15,10 @@ if "current_notebook_id" not in st.session_state:
     st.session_state.current_notebook_id = None # Root
 if "breadcrumbs" not in st.session_state:
     st.session_state.breadcrumbs = [] # List of {"id": int, "name": str}
-if "study_queue" not in st.session_state:
-    st.session_state.study_queue = []
+if "study_session_id" not in st.session_state:
+    st.session_state.study_session_id = None # Server-side study session
+if "study_total" not in st.session_state:
+    st.session_state.study_total = 0
 if "current_question_index" not in st.session_state:
     st.session_state.current_question_index = 0
 
@@ -35,8 +39,24 @@ def navigate_up(index):
         st.session_state.breadcrumbs = st.session_state.breadcrumbs[:index+1]
     st.rerun()
 
+# --- Debug Timings ---
+
+# Enable with FRONTEND_DEBUG=1 or by opening the app with ?debug=1
+DEBUG = os.getenv("FRONTEND_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+def render_debug_sidebar(render_seconds):
+    with st.sidebar:
+        st.markdown("---")
+        st.caption("🐞 Debug timings")
+        st.metric("Page render", f"{render_seconds * 1000:.0f} ms")
+        for label, seconds in st.session_state.get("api_timings", []):
+            st.text(f"{label}: {seconds * 1000:.0f} ms")
+
 # --- Main App ---
 
+st.session_state.api_timings = []
+render_started = time.perf_counter()
+
 if st.session_state.page == "home":
     home.render(navigate_to, navigate_up)
 elif st.session_state.page == "study_setup":
@@ -47,3 +67,6 @@ elif st.session_state.page == "tools":
     tools.render(navigate_to)
 elif st.session_state.page == "metrics":
     metrics.render(navigate_to)
+
+if DEBUG:
+    render_debug_sidebar(time.perf_counter() - render_started)
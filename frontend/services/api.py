@@ -1,57 +1,153 @@
 import requests
 import os
+import threading
+import time
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
 
 API_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+# (connect, read) timeouts in seconds; uploads may take much longer to be processed
+TIMEOUT = (3.05, float(os.getenv("BACKEND_TIMEOUT", "30")))
+UPLOAD_TIMEOUT = (3.05, float(os.getenv("BACKEND_UPLOAD_TIMEOUT", "300")))
+# Seconds a cached read (notebooks, questions, breadcrumbs) is served before it is refetched
+READ_CACHE_TTL = int(os.getenv("API_CACHE_TTL", "60"))
+
+class _BackendSession(requests.Session):
+    """Keep-alive session that applies TIMEOUT unless a call passes its own."""
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def _create_http_session():
+    session = _BackendSession()
+    # Retries connection errors and gateway errors, but only for idempotent methods (never POST)
+    retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=Retry.DEFAULT_ALLOWED_METHODS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# One connection pool per Streamlit process, reused across reruns and browser sessions
+_http = _create_http_session()
+
+# Worker threads for API.fetch_all, shared by all browser sessions; sized to the HTTP pool
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api-fetch")
+
+def record_timing(label, seconds):
+    """Append a (label, seconds) entry to this script run's timings, shown in the debug sidebar."""
+    if get_script_run_ctx() is not None:
+        st.session_state.setdefault("api_timings", []).append((label, seconds))
+
+@st.cache_data(ttl=READ_CACHE_TTL, show_spinner=False)
+def _cached_get(path, params=None):
+    """(json, lower-cased headers) of GET path, cached until READ_CACHE_TTL passes or API.invalidate() runs.
+
+    Failed requests raise instead of returning, so errors are never cached.
+    """
+    res = _http.get(f"{API_URL}{path}", params=dict(params) if params else None)
+    res.raise_for_status()
+    return res.json(), {name.lower(): value for name, value in res.headers.items()}
+
+DEFAULT_STATS = {
+    "total_questions": 0,
+    "attempted": 0,
+    "correct": 0,
+    "incorrect": 0,
+    "accuracy": 0.0
+}
+
+# Last stats response per URL as (ETag, body), shared by every Streamlit session in this process
+_stats_responses = {}
+
 class API:
+    @staticmethod
+    def invalidate():
+        """Drop every cached read; called by each call that changes data on the backend."""
+        _cached_get.clear()
+
+    @staticmethod
+    def fetch_all(calls):
+        """Run independent API calls in parallel and return their results under the same keys.
+
+        calls maps a name to a zero-argument callable, e.g.
+        ``API.fetch_all({"tree": API.get_tree_stats, "stats": lambda: API.get_stats(nb_id)})``.
+        Each call's duration and the batch's wall time are recorded with record_timing.
+        """
+        ctx = get_script_run_ctx()
+
+        def timed(name, call):
+            # Lets calls use st.* (errors, caches) from the worker thread
+            add_script_run_ctx(threading.current_thread(), ctx)
+            started = time.perf_counter()
+            result = call()
+            return result, time.perf_counter() - started
+
+        started = time.perf_counter()
+        futures = {name: _fetch_pool.submit(timed, name, call) for name, call in calls.items()}
+        results = {}
+        for name, future in futures.items():
+            results[name], seconds = future.result()
+            record_timing(name, seconds)
+        record_timing(f"fetch_all ({len(calls)} calls)", time.perf_counter() - started)
+        return results
+
     @staticmethod
     def get_notebooks():
         try:
-            res = requests.get(f"{API_URL}/notebooks/")
-            if res.status_code == 200:
-                return res.json()
+            return _cached_get("/notebooks/")[0]
+        except requests.HTTPError:
             return []
         except Exception as e:
             st.error(f"Failed to connect to backend: {e}")
             return []
 
+    @staticmethod
+    def get_breadcrumbs(notebook_id):
+        try:
+            return [{"id": nb["id"], "name": nb["name"]} for nb in _cached_get(f"/notebooks/{notebook_id}/breadcrumbs")[0]]
+        except Exception:
+            return []
+
     @staticmethod
     def create_notebook(name, parent_id=None):
         payload = {"name": name, "parent_id": parent_id}
-        res = requests.post(f"{API_URL}/notebooks/", json=payload)
+        res = _http.post(f"{API_URL}/notebooks/", json=payload)
+        API.invalidate()
         return res.json()
 
     @staticmethod
     def delete_notebook(notebook_id):
-        res = requests.delete(f"{API_URL}/notebooks/{notebook_id}")
+        res = _http.delete(f"{API_URL}/notebooks/{notebook_id}")
+        API.invalidate()
         return res.status_code == 200
 
     @staticmethod
     def upload_questions(notebook_id, questions_json):
-        res = requests.post(f"{API_URL}/questions/upload/{notebook_id}", json=questions_json)
+        res = _http.post(f"{API_URL}/questions/upload/{notebook_id}", json=questions_json, timeout=UPLOAD_TIMEOUT)
+        API.invalidate()
         return res
 
     @staticmethod
-    def get_study_questions(notebook_id, mode="all", randomize=False):
+    def create_study_session(notebook_id, mode="all", randomize=False, count=None):
         try:
-            params = {"mode": mode, "randomize": randomize}
-            # Route is /study/{id}, not /questions/study/{id}
-            res = requests.get(f"{API_URL}/study/{notebook_id}", params=params)
+            payload = {"notebook_id": notebook_id, "mode": mode, "randomize": randomize, "count": count}
+            res = _http.post(f"{API_URL}/study/sessions/", json=payload)
             if res.status_code == 200:
                 return res.json()
             st.error(f"Backend Error ({res.status_code}): {res.text}")
-            return []
+            return None
         except Exception as e:
             st.error(f"Connection Error: {e}")
-            return []
+            return None
 
     @staticmethod
-    def submit_attempt(question_id, selected_option):
+    def get_study_session(session_id):
         try:
-            payload = {"question_id": question_id, "selected_option": selected_option}
-            # Route is /attempt/, not /questions/attempt/
-            res = requests.post(f"{API_URL}/attempt/", json=payload)
+            res = _http.get(f"{API_URL}/study/sessions/{session_id}")
             if res.status_code == 200:
                 return res.json()
             return None
@@ -59,64 +155,108 @@ class API:
             return None
 
     @staticmethod
-    def get_stats(notebook_id):
+    def get_study_session_questions(session_id, offset, limit=10):
+        """Returns [{"position", "question"}, ...] or None if the backend could not be reached."""
         try:
-            res = requests.get(f"{API_URL}/stats/{notebook_id}")
+            params = {"offset": offset, "limit": limit}
+            res = _http.get(f"{API_URL}/study/sessions/{session_id}/questions", params=params)
             if res.status_code == 200:
                 return res.json()
-            # Return default stats on failure
-            return {
-                "total_questions": 0,
-                "attempted": 0,
-                "correct": 0,
-                "incorrect": 0,
-                "accuracy": 0.0
-            }
+            return None
         except Exception:
-            return {
-                "total_questions": 0,
-                "attempted": 0,
-                "correct": 0,
-                "incorrect": 0,
-                "accuracy": 0.0
-            }
+            return None
 
     @staticmethod
-    def get_global_stats():
+    def update_study_session(session_id, position):
         try:
-            res = requests.get(f"{API_URL}/stats/global")
+            res = _http.patch(f"{API_URL}/study/sessions/{session_id}", json={"position": position})
+            return res.status_code == 200
+        except Exception:
+            return False
+
+    @staticmethod
+    def submit_attempt(question_id, selected_option):
+        try:
+            payload = {"question_id": question_id, "selected_option": selected_option}
+            # Route is /attempt/, not /questions/attempt/
+            res = _http.post(f"{API_URL}/attempt/", json=payload)
+            API.invalidate()
             if res.status_code == 200:
                 return res.json()
-            return {
-                "total_questions": 0,
-                "attempted": 0,
-                "correct": 0,
-                "incorrect": 0,
-                "accuracy": 0.0
-            }
+            return None
         except Exception:
-            return {
-                "total_questions": 0,
-                "attempted": 0,
-                "correct": 0,
-                "incorrect": 0,
-                "accuracy": 0.0
-            }
+            return None
 
     @staticmethod
-    def get_questions(notebook_id):
+    def submit_attempts(records):
+        """Flush buffered answers in one request.
+
+        records are {"question_id", "selected_option", "answered_at" (ISO time, optional)};
+        returns the per-record results in order, or None if the batch could not be delivered.
+        """
         try:
-            res = requests.get(f"{API_URL}/questions/notebook/{notebook_id}")
+            res = _http.post(f"{API_URL}/attempts/batch", json={"attempts": records})
+            API.invalidate()
             if res.status_code == 200:
-                return res.json()
-            return []
+                return res.json()["results"]
+            return None
         except Exception:
-            return []
+            return None
+
+    @staticmethod
+    def _get_stats(path, default):
+        """GET a stats resource, revalidating the last copy with its ETag (304 means it is still current)."""
+        url = f"{API_URL}{path}"
+        cached = _stats_responses.get(url)
+        headers = {"If-None-Match": cached[0]} if cached else {}
+        try:
+            res = _http.get(url, headers=headers)
+            if res.status_code == 304 and cached:
+                return cached[1]
+            if res.status_code == 200:
+                stats = res.json()
+                if "ETag" in res.headers:
+                    _stats_responses[url] = (res.headers["ETag"], stats)
+                return stats
+        except Exception:
+            pass
+        return default
+
+    @staticmethod
+    def get_stats(notebook_id):
+        return API._get_stats(f"/stats/{notebook_id}", dict(DEFAULT_STATS))
+
+    @staticmethod
+    def get_global_stats():
+        return API._get_stats("/stats/global", dict(DEFAULT_STATS))
+
+    @staticmethod
+    def get_tree_stats():
+        """Stats of every notebook in one request, as {notebook_id (int): stats}."""
+        tree_stats = API._get_stats("/stats/tree", {})
+        return {int(notebook_id): stats for notebook_id, stats in tree_stats.items()}
+
+    @staticmethod
+    def get_questions_page(notebook_id, limit, after=None):
+        """One keyset page of a notebook's questions: {"items", "next_cursor", "total"}."""
+        try:
+            params = {"limit": limit}
+            if after is not None:
+                params["after"] = after
+            items, headers = _cached_get(f"/questions/notebook/{notebook_id}", tuple(sorted(params.items())))
+            return {
+                "items": items,
+                "next_cursor": headers.get("x-next-cursor"),
+                "total": int(headers.get("x-total-count", 0))
+            }
+        except Exception:
+            return {"items": [], "next_cursor": None, "total": 0}
 
     @staticmethod
     def delete_question(question_id):
         try:
-             res = requests.delete(f"{API_URL}/questions/{question_id}")
+             res = _http.delete(f"{API_URL}/questions/{question_id}")
+             API.invalidate()
              return res.status_code == 200
         except Exception:
              return False
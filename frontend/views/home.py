@@ -3,6 +3,8 @@ import json
 from services.api import API
 from components.ui import render_notebook_card
 
+QUESTIONS_PAGE_SIZE = 50
+
 def get_current_notebook_children(notebooks, target_id):
     if target_id is None:
         return notebooks
@@ -30,6 +32,12 @@ def render(navigate_to, navigate_up):
              navigate_to("tools")
     
     st.title("📚 Notebooks")
+
+    # Breadcrumbs come from the backend's ancestry table so they stay correct after moves/deletes
+    if st.session_state.current_notebook_id:
+        st.session_state.breadcrumbs = API.get_breadcrumbs(st.session_state.current_notebook_id)
+        if not st.session_state.breadcrumbs:
+            st.session_state.current_notebook_id = None
     
     # Breadcrumbs & Navigation
     col_back, col_path = st.columns([1, 10])
@@ -134,7 +142,15 @@ def render(navigate_to, navigate_up):
                  st.session_state.study_context_name = full_context_name
                  navigate_to("study_setup")
         
-        questions = API.get_questions(st.session_state.current_notebook_id)
+        # Keyset paging: a stack of cursors, reset whenever the notebook changes
+        if st.session_state.get("question_cursor_notebook") != st.session_state.current_notebook_id:
+            st.session_state.question_cursor_notebook = st.session_state.current_notebook_id
+            st.session_state.question_cursors = [None]
+
+        page = API.get_questions_page(
+            st.session_state.current_notebook_id, QUESTIONS_PAGE_SIZE, st.session_state.question_cursors[-1]
+        )
+        questions = page["items"]
         if questions:
             for q in questions:
                 # Use columns to put Delete button outside the expander
@@ -156,5 +172,23 @@ def render(navigate_to, navigate_up):
                             st.rerun()
                         else:
                             st.error("Error")
+
+            page_number = len(st.session_state.question_cursors)
+            total_pages = max(1, -(-page["total"] // QUESTIONS_PAGE_SIZE))
+            c_prev, c_page, c_next = st.columns([1, 4, 1])
+            with c_prev:
+                if page_number > 1 and st.button("← Previous", key="questions_prev"):
+                    st.session_state.question_cursors.pop()
+                    st.rerun()
+            with c_page:
+                st.caption(f"Page {page_number} of {total_pages} · {page['total']} questions")
+            with c_next:
+                if page["next_cursor"] and st.button("Next →", key="questions_next"):
+                    st.session_state.question_cursors.append(page["next_cursor"])
+                    st.rerun()
+        elif len(st.session_state.question_cursors) > 1:
+            # The current page was emptied (e.g. by deletions), step back
+            st.session_state.question_cursors.pop()
+            st.rerun()
         else:
             st.info("No questions in this notebook.")
@@ -6,8 +6,15 @@ import pandas as pd
 def render(navigate_to):
     st.title("📊 Metrics Dashboard")
     
+    # The page's independent reads run in parallel
+    fetched = API.fetch_all({
+        "global_stats": API.get_global_stats,
+        "notebooks": API.get_notebooks,
+        "tree_stats": API.get_tree_stats,
+    })
+
     # Global Stats
-    global_stats = API.get_global_stats()
+    global_stats = fetched["global_stats"]
     
     st.markdown("### Global Performance")
     c1, c2, c3, c4 = st.columns(4)
@@ -66,15 +73,15 @@ def render(navigate_to):
                 flat.extend(get_all_notebooks_flat(node['sub_notebooks']))
         return flat
 
-    notebooks_tree = API.get_notebooks()
-    all_notebooks = get_all_notebooks_flat(notebooks_tree)
+    all_notebooks = get_all_notebooks_flat(fetched["notebooks"])
+    tree_stats = fetched["tree_stats"]
     
     nb_data = []
     for nb in all_notebooks:
-        stats = API.get_stats(nb['id'])
+        stats = tree_stats.get(nb['id'])
         # Only show notebooks that have had some activity or questions to reduce clutter
         # Or at least show all. Let's show all for now.
-        if stats['total_questions'] > 0:
+        if stats and stats['total_questions'] > 0:
             nb_data.append({
                 "Notebook": nb['name'],
                 "Accuracy": stats['accuracy'] * 100, # Scale to 0-100
@@ -2,18 +2,45 @@ import streamlit as st
 from services.api import API
 from components.ui import render_question_card, render_result_message
 
+PREFETCH_SIZE = 10
+
+def question_at(session_id, idx, total):
+    """First available (position, question) at or after idx, fetching small windows from the server.
+
+    Positions whose question was deleted are skipped. Returns (idx, None) past the end
+    and (None, None) if the backend could not be reached.
+    """
+    while idx < total:
+        start, end = st.session_state.get("study_buffer_range", (0, 0))
+        if not (start <= idx < end):
+            items = API.get_study_session_questions(session_id, idx, PREFETCH_SIZE)
+            if items is None:
+                return None, None
+            st.session_state.study_buffer = {item['position']: item['question'] for item in items}
+            st.session_state.study_buffer_range = (idx, idx + PREFETCH_SIZE)
+        if idx in st.session_state.study_buffer:
+            return idx, st.session_state.study_buffer[idx]
+        idx += 1
+    return idx, None
+
 def render(navigate_to):
-    questions = st.session_state.get("study_queue", [])
-    idx = st.session_state.get("current_question_index", 0)
-    
-    if idx >= len(questions):
+    session_id = st.session_state.get("study_session_id")
+    total = st.session_state.get("study_total", 0)
+    idx, q = question_at(session_id, st.session_state.get("current_question_index", 0), total) if session_id else (total, None)
+
+    if idx is None:
+        st.error("Could not load questions from the backend.")
+        if st.button("Return Home"):
+            navigate_to("home")
+        return
+
+    st.session_state.current_question_index = idx
+    if q is None:
         st.success("🎉 You have completed this session!")
         if st.button("Return Home"):
             navigate_to("home")
         return
 
-    q = questions[idx]
-    
     # Context Header
     context_name = st.session_state.get("study_context_name", "")
     if context_name:
@@ -22,7 +49,7 @@ def render(navigate_to):
     # Header with actions
     c1, c2, c3 = st.columns([4, 1, 1])
     with c1:
-        st.subheader(f"Question {idx + 1} of {len(questions)}")
+        st.subheader(f"Question {idx + 1} of {total}")
     
     with c2:
         if st.button("⏹ Stop", help="Exit Session"):
@@ -31,17 +58,14 @@ def render(navigate_to):
     with c3:
         if st.button("🗑 Delete", key=f"del_study_{q['id']}", help="Delete Question"):
             if API.delete_question(q['id']):
-                questions.pop(idx)
-                st.session_state.study_queue = questions
-                if f"answered_{idx}" in st.session_state:
-                     del st.session_state[f"answered_{idx}"]
-                if f"result_{idx}" in st.session_state:
-                     del st.session_state[f"result_{idx}"]
-                
+                # The server skips deleted questions; drop it locally and move on
+                st.session_state.study_buffer.pop(idx, None)
+                st.session_state.current_question_index = idx + 1
+                API.update_study_session(session_id, idx + 1)
                 st.toast("Deleted")
                 st.rerun()
     
-    render_question_card(q, idx, len(questions))
+    render_question_card(q, idx, total)
     
     # State management for current question
     # Note: If we shuffle, IDs are better keys, but index is simple for now. 
@@ -68,5 +92,6 @@ def render(navigate_to):
         render_result_message(result['is_correct'], result['explanation'])
         
         if st.button("Next Question →"):
-            st.session_state.current_question_index += 1
+            st.session_state.current_question_index = idx + 1
+            API.update_study_session(session_id, idx + 1)
             st.rerun()
@@ -3,6 +3,14 @@ from services.api import API
 import plotly.express as px
 import pandas as pd
 
+def start_study(study, position):
+    """Point the session view at a server-side study session; questions are fetched on demand."""
+    st.session_state.study_session_id = study['id']
+    st.session_state.study_total = study['total']
+    st.session_state.current_question_index = position
+    st.session_state.study_buffer = {}
+    st.session_state.study_buffer_range = (0, 0)
+
 def render(navigate_to):
     nb = st.session_state.get("selected_notebook_for_study")
     context_name = st.session_state.get("study_context_name", nb.get('name') if nb else "Unknown")
@@ -40,24 +48,29 @@ def render(navigate_to):
         mode = st.selectbox("Mode", ["all", "incorrect", "unresolved"], index=2, format_func=lambda x: x.capitalize())
         # Default randomize to False
         randomize = st.checkbox("Randomize Order", value=False)
+        # Quick drill: the backend samples this many random questions (0 = the whole set)
+        count = st.number_input("Number of questions (0 = all)", min_value=0, max_value=1000, value=0, step=5)
         
         st.write("")
         if st.button("Start Session", type="primary", use_container_width=True):
-            questions = API.get_study_questions(nb['id'], mode, randomize)
-            if not questions:
+            study = API.create_study_session(nb['id'], mode, randomize, count or None)
+            if study and study['total'] == 0:
                 st.warning("No questions found for this criteria.")
-            else:
-                st.session_state.study_queue = questions
-                st.session_state.current_question_index = 0
-                navigate_to("study_session")
-                # Ensure rerun happens if navigate_to doesn't trigger it immediately (though it should)
-                # It seems in some streamlit versions/contexts updates to session state 
-                # inside buttons might not persist if page change happens too fast? 
-                # Actually, navigate_to calls rerun. 
-                # Let's clean up old session state vars just in case.
+            elif study:
+                # Clear per-question answer state from previous sessions
                 keys_to_clear = [k for k in st.session_state.keys() if k.startswith("answered_") or k.startswith("result_")]
                 for k in keys_to_clear:
                     del st.session_state[k]
+                start_study(study, 0)
+                navigate_to("study_session")
+
+        # Offer to resume the last unfinished session on this notebook
+        if st.session_state.get("study_session_id"):
+            last = API.get_study_session(st.session_state.study_session_id)
+            if last and last['notebook_id'] == nb['id'] and last['position'] < last['total']:
+                if st.button(f"Resume Session ({last['position']}/{last['total']} done)", use_container_width=True):
+                    start_study(last, last['position'])
+                    navigate_to("study_session")
             
     # Quick Stats Text
     st.markdown("### Details")